@@ -0,0 +1,209 @@
+import os
+import sys
+import argparse
+
+from .maya import index
+from .maya import usage
+from .maya import transcode
+from .maya import watch
+from .maya.binary import scan_maya_binary
+from .maya.common import PARSE_ERRORS
+
+
+def _index_command(args):
+    scene_index = index.SceneIndex(args.database)
+    try:
+        paths = list(index.iter_scene_files(args.roots))
+        updated = scene_index.update(paths, log=sys.stderr)
+        pruned = scene_index.prune(paths) if args.prune else 0
+    finally:
+        scene_index.close()
+    print "Indexed %d of %d files (%d removed)" % (updated, len(paths), pruned)
+
+
+def _query_command(args):
+    scene_index = index.SceneIndex(args.database)
+    try:
+        if args.glob:
+            paths = scene_index.search(args.kind, args.value)
+        else:
+            paths = scene_index.lookup(args.kind, args.value)
+    finally:
+        scene_index.close()
+    for path in paths:
+        print path
+
+
+def _scan_command(args):
+    damaged = 0
+    for path in args.paths:
+        with open(path, "rb") as stream:
+            report = scan_maya_binary(stream, max_damage=args.max_damage)
+        if not report.damage:
+            if not args.quiet:
+                print "%s: OK (%d chunks)" % (path, report.chunk_count)
+            continue
+
+        damaged += 1
+        print "%s: DAMAGED (%d of %d bytes, %d chunks recoverable)" % (
+            path, report.recoverable_bytes, report.file_size,
+            report.recoverable_chunks)
+        for damage in report.damage:
+            print "  @%d: %s" % (damage.offset, damage.message)
+    return 1 if damaged else 0
+
+
+def _usage_command(args):
+    with open(args.path, "rb") as stream:
+        if args.path.lower().endswith(".ma"):
+            profiler = usage.MayaAsciiUsageProfiler(stream)
+        else:
+            profiler = usage.MayaBinaryUsageProfiler(stream)
+        byte_usage = profiler.profile()
+
+    total = byte_usage.total_bytes
+    print "%s: %d bytes" % (args.path, total)
+    for category in byte_usage.categories:
+        print
+        print "By %s:" % category
+        for key, size, count in byte_usage.top(category, args.top):
+            percent = 100.0 * size / total if total else 0.0
+            print "  %14d %6.2f%% %10d  %s" % (size, percent, count, key)
+
+    if byte_usage.error:
+        sys.stderr.write("%s: damaged, only the bytes before the damage are "
+                         "broken down (%s)\n" % (args.path, byte_usage.error))
+        return 1
+    return 0
+
+
+def _transcode_command(args):
+    # Write to a temporary file first, so that a failed or lossy conversion
+    # never leaves a partial output behind.
+    temp_path = args.output + ".tmp"
+    try:
+        with open(args.input, "rb") as stream:
+            with open(temp_path, "wb") as output:
+                if args.input.lower().endswith(".ma"):
+                    transcoder = transcode.MayaAsciiToBinaryTranscoder(stream, output)
+                else:
+                    transcoder = transcode.MayaBinaryToAsciiTranscoder(stream, output)
+                skipped = transcoder.transcode()
+    except PARSE_ERRORS as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        sys.stderr.write("%s: %s\n" % (args.input, e))
+        return 1
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    for kind, count in sorted(skipped.items()):
+        sys.stderr.write("%s: skipped %d x %s\n" % (args.input, count, kind))
+    if skipped and not args.lossy:
+        os.remove(temp_path)
+        sys.stderr.write("%s: not converted, use --lossy to drop unsupported "
+                         "data\n" % args.input)
+        return 1
+
+    os.rename(temp_path, args.output)
+    return 0
+
+
+class _LoggingSceneWatcher(watch.SceneWatcher):
+
+    def on_file_indexed(self, path):
+        print "Indexed %s" % path
+
+    def on_file_removed(self, path):
+        print "Removed %s" % path
+
+
+def _watch_command(args):
+    scene_index = index.SceneIndex(args.database)
+    try:
+        watcher = _LoggingSceneWatcher(scene_index, args.roots,
+                                       workers=args.workers,
+                                       debounce=args.debounce,
+                                       log=sys.stderr)
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+    finally:
+        scene_index.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sansapp")
+    subparsers = parser.add_subparsers()
+
+    index_parser = subparsers.add_parser(
+        "index", help="Index node types, names, strings, plugins and "
+                      "references of all scenes below the given roots.")
+    index_parser.add_argument("database")
+    index_parser.add_argument("roots", nargs="+")
+    index_parser.add_argument("--prune", action="store_true",
+                              help="Remove indexed files not found below "
+                                   "the given roots.")
+    index_parser.set_defaults(func=_index_command)
+
+    query_parser = subparsers.add_parser(
+        "query", help="List indexed scenes containing a term.")
+    query_parser.add_argument("database")
+    query_parser.add_argument("kind", choices=index.TERM_KINDS)
+    query_parser.add_argument("value")
+    query_parser.add_argument("--glob", action="store_true",
+                              help="Match value as a glob pattern.")
+    query_parser.set_defaults(func=_query_command)
+
+    scan_parser = subparsers.add_parser(
+        "scan", help="Validate the chunk structure of Maya binary files.")
+    scan_parser.add_argument("paths", nargs="+")
+    scan_parser.add_argument("--max-damage", type=int, default=None,
+                             help="Stop scanning a file after this many "
+                                  "damaged chunks.")
+    scan_parser.add_argument("-q", "--quiet", action="store_true",
+                             help="Only report damaged files.")
+    scan_parser.set_defaults(func=_scan_command)
+
+    usage_parser = subparsers.add_parser(
+        "usage", help="Break down the size of a scene by node type, node "
+                      "name and attribute type (or command for .ma files).")
+    usage_parser.add_argument("path")
+    usage_parser.add_argument("-n", "--top", type=int, default=20,
+                              help="Number of entries listed per category.")
+    usage_parser.set_defaults(func=_usage_command)
+
+    transcode_parser = subparsers.add_parser(
+        "transcode", help="Convert a .ma file to a 64-bit .mb file, or a .mb "
+                          "file to a .ma file.")
+    transcode_parser.add_argument("input")
+    transcode_parser.add_argument("output")
+    transcode_parser.add_argument("--lossy", action="store_true",
+                                  help="Write the output even if some data "
+                                       "could not be converted.")
+    transcode_parser.set_defaults(func=_transcode_command)
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="Index all scenes below the given roots, then keep the "
+                      "index current as scenes are saved, moved or deleted.")
+    watch_parser.add_argument("database")
+    watch_parser.add_argument("roots", nargs="+")
+    watch_parser.add_argument("--workers", type=int, default=4,
+                              help="Number of processes parsing changed "
+                                   "scenes, 0 to parse in the main process.")
+    watch_parser.add_argument("--debounce", type=float, default=1.0,
+                              help="Seconds a scene must stay unchanged "
+                                   "before it is reparsed.")
+    watch_parser.set_defaults(func=_watch_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,2 +1,2 @@
 from ascii import MayaAsciiParser 
-from binary import MayaBinaryParser
+from binary import MayaBinaryParser, MayaLazyValue, scan_maya_binary, register_attribute_type
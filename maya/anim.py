@@ -0,0 +1,114 @@
+import os
+from array import array
+
+from common import *
+from ascii import MayaAsciiParser
+from binary import MayaBinaryParser
+from ..util.prefetch import ReadAheadScheduler
+
+
+_KEY_FIELDS = (("times", "d"),
+               ("values", "d"),
+               ("in_tangent_types", "h"),
+               ("out_tangent_types", "h"),
+               ("in_tangent_x", "d"),
+               ("in_tangent_y", "d"),
+               ("out_tangent_x", "d"),
+               ("out_tangent_y", "d"))
+
+
+class AnimCurveSet(object):
+    """Animation curves of any number of scenes, stored as ragged arrays.
+
+    Per-key data of all curves is concatenated into one array per AnimCurve
+    field. The keys of curve i are at offsets[i]:offsets[i + 1] in each of
+    these arrays, and the curve was read from paths[file_indices[i]].
+    """
+
+    def __init__(self):
+        self.paths = []
+        self.file_indices = array("l")
+        self.names = []
+        self.nodetypes = []
+        self.weighted = array("b")
+        self.offsets = array("l", [0])
+        for field, typecode in _KEY_FIELDS:
+            setattr(self, field, array(typecode))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError, "AnimCurveSet index out of range"
+        begin = self.offsets[index]
+        end = self.offsets[index + 1]
+        keys = dict((field, getattr(self, field)[begin:end])
+                    for field, typecode in _KEY_FIELDS)
+        return AnimCurve(name=self.names[index],
+                         nodetype=self.nodetypes[index],
+                         weighted=bool(self.weighted[index]),
+                         **keys)
+
+    def add_file(self, path):
+        self.paths.append(path)
+        return len(self.paths) - 1
+
+    def append(self, file_index, curve):
+        self.file_indices.append(file_index)
+        self.names.append(curve.name)
+        self.nodetypes.append(curve.nodetype)
+        self.weighted.append(curve.weighted)
+        for field, typecode in _KEY_FIELDS:
+            getattr(self, field).extend(getattr(curve, field))
+        self.offsets.append(len(self.times))
+
+
+class _AsciiAnimCurveReader(MayaAsciiParser):
+
+    def __init__(self, stream, callback):
+        MayaAsciiParser.__init__(self, stream)
+        self.__callback = callback
+
+    def on_anim_curve(self, curve):
+        self.__callback(curve)
+
+
+class _BinaryAnimCurveReader(MayaBinaryParser):
+
+    def __init__(self, stream, callback):
+        # Values of other attributes are never looked at
+        MayaBinaryParser.__init__(self, stream, lazy=True, cache_size=0)
+        self.__callback = callback
+
+    def on_anim_curve(self, curve):
+        self.__callback(curve)
+
+
+def read_anim_curves(paths, curves=None, log=None, workers=4):
+    """Read the animation curves of all scenes in paths into an
+    AnimCurveSet.
+
+    Scenes are read ahead on a pool of worker threads while earlier scenes
+    are parsed. Scenes that fail to parse are reported to log and
+    contribute only the curves read before the error.
+    """
+    curves = curves if curves is not None else AnimCurveSet()
+    for prefetched in ReadAheadScheduler(paths, workers=workers):
+        path = prefetched.path
+        file_index = curves.add_file(path)
+        callback = lambda curve: curves.append(file_index, curve)
+        try:
+            if prefetched.error:
+                raise prefetched.error
+            if os.path.splitext(path)[1].lower() == ".ma":
+                reader = _AsciiAnimCurveReader(prefetched.stream, callback)
+            else:
+                reader = _BinaryAnimCurveReader(prefetched.stream, callback)
+            reader.parse()
+        except PARSE_ERRORS as e:
+            if log:
+                log.write("%s: %s\n" % (path, e))
+    return curves
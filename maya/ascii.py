@@ -5,6 +5,39 @@ class MayaAsciiError(ValueError):
     pass
 
 
+_NUMERIC_TYPES = frozenset(["short2", "short3", "long2", "long3",
+                            "float2", "float3", "double2", "double3",
+                            "matrix"])
+
+
+def _parse_bool(value):
+    return value in ("on", "yes", "true", "1")
+
+
+def _parse_number(value):
+    if value in ("on", "yes", "true"):
+        return True
+    elif value in ("off", "no", "false"):
+        return False
+    return float(value)
+
+
+def _unescape_string(value):
+    return value.decode("string_escape")
+
+
+def _flag_value(args, argptr):
+    if argptr + 1 >= len(args):
+        raise MayaAsciiError, "Missing value for flag: %s" % args[argptr]
+    return args[argptr + 1]
+
+
+# Flags taking a value that precede the positional arguments of a command
+_REQUIRES_VALUE_FLAGS = frozenset(["-nt", "-nodeType", "-dt", "-dataType"])
+_FILE_VALUE_FLAGS = frozenset(["-op", "-options", "-typ", "-type",
+                               "-shd", "-sharedNodes"])
+
+
 class MayaAsciiParserBase(MayaParserBase):
     def __init__(self):
         self.__command_handlers = {
@@ -13,7 +46,11 @@ class MayaAsciiParserBase(MayaParserBase):
             "file": self._exec_file,
             "createNode": self._exec_create_node,
             "setAttr": self._exec_set_attr,
+            "currentUnit": self._exec_current_unit,
+            "select": self._exec_select,
+            "connectAttr": self._exec_connect_attr,
         }
+        self.__anim_curve = None
 
     def on_comment(self, value):
         pass
@@ -30,12 +67,28 @@ class MayaAsciiParserBase(MayaParserBase):
         return command in self.__command_handlers
 
     def _exec_requires(self, args):
-        if args[0] == "maya":
-            self.on_requires_maya(args[1])
+        # Node and data types provided by a plugin are listed before it
+        positional = []
+        argptr = 0
+        while argptr < len(args):
+            arg = args[argptr]
+            if arg in _REQUIRES_VALUE_FLAGS:
+                _flag_value(args, argptr)
+                argptr += 2
+            else:
+                positional.append(arg)
+                argptr += 1
+
+        if len(positional) < 2:
+            raise MayaAsciiError, "requires: Expected a name and a version"
+        if positional[0] == "maya":
+            self.on_requires_maya(positional[1])
         else:
-            self.on_requires_plugin(args[0], args[1])
+            self.on_requires_plugin(positional[0], positional[1])
 
     def _exec_file_info(self, args):
+        if len(args) < 2:
+            raise MayaAsciiError, "fileInfo: Expected a key and a value"
         self.on_file_info(args[0], args[1])
 
     def _exec_file(self, args):
@@ -52,16 +105,19 @@ class MayaAsciiParserBase(MayaParserBase):
                 reference = True
                 argptr += 1
             elif arg in ("-rdi", "--referenceDepthInfo"):
-                reference_depth_info = int(args[argptr + 1])
+                reference_depth_info = int(_flag_value(args, argptr))
                 argptr += 2
             elif arg in ("-ns", "--namespace"):
-                namespace = args[argptr + 1]
+                namespace = _flag_value(args, argptr)
                 argptr += 2
             elif arg in ("-dr", "--deferReference"):
-                defer_reference = bool(int(args[argptr + 1]))
+                defer_reference = bool(int(_flag_value(args, argptr)))
                 argptr += 2
             elif arg in ("-rfn", "--referenceNode"):
-                reference_node = args[argptr + 1]
+                reference_node = _flag_value(args, argptr)
+                argptr += 2
+            elif arg in _FILE_VALUE_FLAGS:
+                _flag_value(args, argptr)
                 argptr += 2
             else:
                 break
@@ -71,6 +127,8 @@ class MayaAsciiParserBase(MayaParserBase):
             self.on_file_reference(path)
 
     def _exec_create_node(self, args):
+        if not args:
+            raise MayaAsciiError, "createNode: Expected a node type"
         nodetype = args[0]
 
         name = None
@@ -81,10 +139,10 @@ class MayaAsciiParserBase(MayaParserBase):
         while argptr < len(args):
             arg = args[argptr]
             if arg in ("-n", "--name"):
-                name = args[argptr + 1]
+                name = _flag_value(args, argptr)
                 argptr += 2
             elif arg in ("-p", "--parent"):
-                parent = args[argptr + 1]
+                parent = _flag_value(args, argptr)
                 argptr += 2
             elif arg in ("-s", "--shared"):
                 shared = True
@@ -92,10 +150,128 @@ class MayaAsciiParserBase(MayaParserBase):
             else:
                 raise MayaAsciiError, "Unexpected argument: %s" % arg
 
+        self._finish_anim_curve()
+        if is_anim_curve_type(nodetype):
+            self.__anim_curve = AnimCurveDecoder(nodetype, name)
+
         self.on_create_node(nodetype, name, parent)
 
+    def _exec_current_unit(self, args):
+        angle = None
+        linear = None
+        time = None
+
+        argptr = 0
+        while argptr < len(args):
+            arg = args[argptr]
+            if arg in ("-a", "--angle"):
+                angle = _flag_value(args, argptr)
+                argptr += 2
+            elif arg in ("-l", "--linear"):
+                linear = _flag_value(args, argptr)
+                argptr += 2
+            elif arg in ("-t", "--time"):
+                time = _flag_value(args, argptr)
+                argptr += 2
+            elif arg in ("-f", "--fullName", "-ua", "--updateAnimation"):
+                argptr += 2
+            else:
+                argptr += 1
+
+        self.on_current_unit(angle=angle, linear=linear, time=time)
+
+    def _exec_select(self, args):
+        self._finish_anim_curve()
+        for arg in args:
+            if not arg.startswith("-"):
+                self.on_select(arg)
+
+    def _exec_connect_attr(self, args):
+        plugs = []
+        argptr = 0
+        while argptr < len(args):
+            arg = args[argptr]
+            if arg in ("-l", "--lock", "-rd", "--referenceDest"):
+                argptr += 2
+            elif arg.startswith("-"):
+                argptr += 1
+            else:
+                plugs.append(arg)
+                argptr += 1
+
+        if len(plugs) >= 2:
+            self.on_connect_attr(plugs[0], plugs[1])
+
     def _exec_set_attr(self, args):
-        pass
+        keyable = None
+        channelbox = None
+        lock = None
+        type = None
+
+        # Flags may appear before or after the plug name
+        positional = []
+        argptr = 0
+        while argptr < len(args):
+            arg = args[argptr]
+            if arg in ("-k", "--keyable"):
+                keyable = _parse_bool(_flag_value(args, argptr))
+                argptr += 2
+            elif arg in ("-cb", "--channelBox"):
+                channelbox = _parse_bool(_flag_value(args, argptr))
+                argptr += 2
+            elif arg in ("-l", "--lock"):
+                lock = _parse_bool(_flag_value(args, argptr))
+                argptr += 2
+            elif arg in ("-type", "--type"):
+                type = _flag_value(args, argptr)
+                argptr += 2
+            elif arg in ("-s", "--size", "-ch", "--capacityHint", "-c", "--clamp",
+                         "-ca", "--caching"):
+                _flag_value(args, argptr)
+                argptr += 2
+            elif arg in ("-av", "--alteredValue"):
+                argptr += 1
+            else:
+                positional.append(arg)
+                argptr += 1
+
+        if not positional:
+            return
+
+        plug = positional[0]
+        values = positional[1:]
+
+        if keyable is not None or channelbox is not None or lock is not None:
+            self.on_set_attr_flags(plug, keyable=keyable,
+                                   channelbox=channelbox, lock=lock)
+
+        if not values:
+            return
+
+        # Only strings and plain numeric data are decoded for now. Typed
+        # values without a known layout are passed through as raw tokens.
+        if type == "string":
+            value = _unescape_string(values[0])
+        elif type is None or type in _NUMERIC_TYPES:
+            try:
+                value = tuple(_parse_number(v) for v in values)
+            except ValueError:
+                value = tuple(values)
+            if type is None and len(value) == 1:
+                value = value[0]
+        else:
+            value = tuple(values)
+
+        if self.__anim_curve is not None and self.__anim_curve.accepts(plug):
+            self.__anim_curve.set_plug(plug, value)
+        else:
+            self.on_set_attr(plug, value, type=type)
+
+    def _finish_anim_curve(self):
+        if self.__anim_curve is not None:
+            curve = self.__anim_curve.curve()
+            self.__anim_curve = None
+            self.on_anim_curve(curve)
 
 
 class MayaAsciiParser(MayaAsciiParserBase):
@@ -107,6 +283,7 @@ class MayaAsciiParser(MayaAsciiParserBase):
     def parse(self):
         while self.__parse_next_command():
             pass
+        self._finish_anim_curve()
 
     def __parse_next_command(self):
         lines = []
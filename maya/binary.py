@@ -2,12 +2,13 @@ import os
 import re
 import sys
 import struct
-from functools import wraps
+from functools import wraps, partial
 from contextlib import contextmanager
 from collections import namedtuple
 
 from common import *
 from ..util.iff import *
+from ..util.cache import LruCache
 from ..util import *
 
 
@@ -64,112 +65,298 @@ MAYA_BINARY_64 = IffFormat(endianness=IFF_BIG_ENDIAN,
                            chunk_alignment=8)
 
 
+MAYA_2012_TYPEIDS = os.path.join(os.path.dirname(__file__),
+                                 "modules", "maya", "2012", "typeids.dat")
+
+
 class MayaBinaryError(RuntimeError):
     pass
 
 
-class MayaBinaryParser(IffParser, MayaParserBase):
-    def __init__(self, stream):
-        # Determine Maya format based on magic number
-        # Maya 2014+ files begin with a FOR8 block, indicating a 64-bit format.
-        magic_number = stream.read(4)
+_mtypeid_databases = {}
+
+
+def load_mtypeid_database(path):
+    """Return a dict mapping MTypeIds to node type names.
+
+    Databases are only read once, the returned dict must not be modified.
+    """
+    database = _mtypeid_databases.get(path)
+    if database is None:
+        database = {}
+        with open(path) as f:
+            line = f.readline()
+            while line:
+                mtypeid = be_word4(line[:4])
+                typename = line[5:].strip()
+                database[mtypeid] = typename
+                line = f.readline()
+        _mtypeid_databases[path] = database
+    return database
+
+
+def _decode_string(buf, offset, length, count):
+    end = buf.find("\0", offset, offset + length)
+    if end == -1:
+        end = offset + length
+    return buf[offset:end]
+
+
+def _decode_doubles(buf, offset, length, count):
+    if length < 8 * count:
+        raise MayaBinaryError, "Attribute data too short for %d doubles" % count
+    value = struct.unpack_from(">%dd" % count, buf, offset)
+    return value[0] if count == 1 else value
+
+
+def _decode_double3s(buf, offset, length, count):
+    if length < 24 * count:
+        raise MayaBinaryError, "Attribute data too short for %d double3s" % count
+    return struct.unpack_from(">%dd" % (3 * count), buf, offset)
+
+
+# Big endian struct formats of per-key animCurve values by element size
+_KEY_VALUE_FORMATS = {
+    "d": {8: "d", 4: "f"},
+    "h": {4: "l", 2: "h", 1: "B"},
+}
+
+
+# Attribute value types by chunk typeid, see register_attribute_type
+_attribute_types = {
+    STR_: ("string", _decode_string),
+    DBLE: ("double", _decode_doubles),
+    DBL3: ("double3", _decode_double3s),
+}
+
+
+def register_attribute_type(typeid, typename, decoder):
+    """Register a decoder for attribute chunks of the given typeid.
+
+    This is how plugin data types (e.g. the MTypeId of an MPxData) are
+    supported. decoder(buf, offset, length, count) is called with the data
+    following the attribute name and flags, and returns the value passed to
+    on_set_attr along with typename. Applies to parsers created afterwards.
+    """
+    if isinstance(typeid, str):
+        typeid = be_word4(typeid)
+    _attribute_types[typeid] = (typename, decoder)
+
+
+class MayaLazyValue(object):
+    """Attribute value that is decoded from the file on first access.
+
+    Holds only the location of the value within the file. Decoded values
+    are kept in a bounded cache shared by all values of a parser.
+    """
+
+    __slots__ = ("__source", "offset", "length", "typeid", "count")
+
+    def __init__(self, source, offset, length, typeid, count):
+        self.__source = source
+        self.offset = offset
+        self.length = length
+        self.typeid = typeid
+        self.count = count
+
+    @property
+    def value(self):
+        return self.__source.decode(self)
+
+    @property
+    def raw(self):
+        return self.__source.raw(self)
+
+    def __repr__(self):
+        return "MayaLazyValue(offset=%d, length=%d, typeid=%r)" % (
+            self.offset, self.length, struct.pack(">L", self.typeid))
+
+
+class _LazyValueSource(object):
+
+    def __init__(self, stream, cache_size, decoders):
+        self.__decoders = decoders
+        self.__buffer = map_stream(stream)
+        self.__cache = LruCache(cache_size)
+
+    def decode(self, lazy_value):
+        key = lazy_value.offset
+        value = self.__cache.get(key, self)
+        if value is self:
+            decoder = self.__decoders[lazy_value.typeid]
+            value = decoder(self.__buffer, lazy_value.offset,
+                            lazy_value.length, lazy_value.count)
+            self.__cache.put(key, value)
+        return value
+
+    def raw(self, lazy_value):
+        return buffer(self.__buffer, lazy_value.offset, lazy_value.length)
+
+
+# currentUnit keyword arguments by header chunk typeid
+_UNIT_KEYWORDS = {
+    AUNI: "angle",
+    LUNI: "linear",
+    TUNI: "time",
+}
+
+_MTYPEID = struct.Struct(">L")
+
+
+def _read_maya_binary_format(stream):
+    # Determine Maya format based on magic number
+    # Maya 2014+ files begin with a FOR8 block, indicating a 64-bit format.
+    magic_number = stream.read(4)
+    stream.seek(0)
+    if magic_number == "FOR4":
+        return MAYA_BINARY_32
+    elif magic_number == "FOR8":
+        return MAYA_BINARY_64
+    else:
+        raise MayaBinaryError, "Bad magic number"
+
+
+def scan_maya_binary(stream, max_damage=None):
+    """Validate the chunk structure of a Maya binary file.
+
+    Only chunk headers are read, so this is cheap enough to reject damaged
+    files before handing them to MayaBinaryParser. Returns an IffScanReport.
+    """
+    try:
+        format = _read_maya_binary_format(stream)
+    except MayaBinaryError as e:
+        stream.seek(0, 2)
+        size = stream.tell()
         stream.seek(0)
-        if magic_number == "FOR4":
-            format = MAYA_BINARY_32
-        elif magic_number == "FOR8":
-            format = MAYA_BINARY_64
-        else:
-            raise MayaBinaryError, "Bad magic number"
+        return IffScanReport(file_size=size,
+                             chunk_count=0,
+                             recoverable_bytes=0,
+                             recoverable_chunks=0,
+                             damage=[IffDamage(offset=0, typeid=None,
+                                               message=str(e))])
+
+    if format == MAYA_BINARY_64:
+        group_typeids = (FOR8, LIS8)
+    else:
+        group_typeids = (FOR4, LIS4)
+    scanner = IffScanner(stream, format, group_typeids=group_typeids)
+    return scanner.scan(max_damage=max_damage)
+
+
+class MayaBinaryParser(IffParser, MayaParserBase):
+    def __init__(self, stream, lazy=False, cache_size=1024):
+        """Create a parser reading from a seekable binary stream.
+
+        If lazy is true, on_set_attr receives MayaLazyValue objects instead
+        of decoded values. At most cache_size decoded lazy values are kept.
+        """
+        format = _read_maya_binary_format(stream)
 
         IffParser.__init__(self, stream, format=format)
         MayaParserBase.__init__(self)
 
         maya64 = format == MAYA_BINARY_64
         self.__maya64 = maya64
-        self.__node_chunk_type = FOR8 if maya64 else FOR4
-        self.__list_chunk_type = LIS8 if maya64 else LIS4
+        self.__value_decoders = dict((typeid, decoder) for typeid, (typename, decoder)
+                                     in _attribute_types.iteritems())
+        self.__lazy_values = (_LazyValueSource(stream, cache_size, self.__value_decoders)
+                              if lazy else None)
+        self.__node_mtypeid = None
+        self.__anim_curve = None
 
         # FIXME load type info modules based on maya and plugin versions
         self.__mtypeid_to_typename = {}
-        self._load_mtypeid_database(os.path.join(os.path.dirname(__file__),
-                                    "modules", "maya", "2012", "typeids.dat"))
-
-    def on_iff_chunk(self, chunk):
-        if chunk.typeid == self.__node_chunk_type:
-            mtypeid = self._read_mtypeid()
-            if mtypeid == MAYA:
-                self._handle_all_chunks()
-            elif mtypeid == HEAD:
-                self._parse_maya_header()
-            elif mtypeid == FREF:
-                self._parse_file_reference()
-            elif mtypeid == CONN:
-                self._parse_connection()
-            else:
-                self._parse_node(mtypeid)
+        self._load_mtypeid_database(MAYA_2012_TYPEIDS)
+
+        # Chunks are dispatched through tables keyed by typeid. Handlers are
+        # bound here, so methods overridden by subclasses are picked up.
+        self._register_chunk_handler(FOR8 if maya64 else FOR4, self.__handle_form)
+        self._register_chunk_handler(LIS8 if maya64 else LIS4, self.__handle_list)
+        self.__form_handlers = {
+            MAYA: self._handle_all_chunks,
+            HEAD: self._parse_maya_header,
+            FREF: self._parse_file_reference,
+            CONN: self._parse_connection,
+        }
+        self.__list_handlers = {
+            CONS: self._handle_all_chunks,
+        }
+        self.__header_handlers = {
+            VERS: self.__parse_requires_maya,
+            PLUG: self.__parse_requires_plugin,
+            FINF: self.__parse_file_info,
+        }
+        self.__node_handlers = dict(
+            (typeid, partial(self._parse_attribute, typeid, typename))
+            for typeid, (typename, decoder) in _attribute_types.iteritems())
+        self.__node_handlers.update({
+            CREA: self.__parse_create_node,
+            SLCT: self.__parse_select,
+            ATTR: self._parse_dynamic_attribute,
+            FLGS: self._parse_node_flags,
+        })
+
+    def __handle_form(self, chunk):
+        mtypeid = self._read_mtypeid()
+        handler = self.__form_handlers.get(mtypeid)
+        if handler is not None:
+            handler()
+        else:
+            self._parse_node(mtypeid)
 
-        elif chunk.typeid == self.__list_chunk_type:
-            mtypeid = self._read_mtypeid()
-            if mtypeid == CONS:
-                self._handle_all_chunks()
+    def __handle_list(self, chunk):
+        handler = self.__list_handlers.get(self._read_mtypeid())
+        if handler is not None:
+            handler()
 
     def _read_mtypeid(self):
-        # 64-bit format still uses 32-bit MTypeIds
-        result = be_read4(self.stream)
-        self._realign()
-        return result
+        # 64-bit format still uses 32-bit MTypeIds. The group's children
+        # are aligned relative to the end of it.
+        mtypeid = _MTYPEID.unpack(self.stream.read(4))[0]
+        self._realign(self.chunk.data_offset + 4)
+        return mtypeid
 
     def _parse_maya_header(self):
-        angle_unit = None
-        linear_unit = None
-        time_unit = None
+        # on_current_unit callback is deferred until all three
+        # angle, linear and time units are read from the stream.
+        handlers = self.__header_handlers
+        units = {}
 
         for chunk in self._iter_chunks():
-            # requires (maya)
-            if chunk.typeid == VERS:
-                self.on_requires_maya(self._read_chunk_data(chunk))
-            
-            # requires (plugin)
-            elif chunk.typeid == PLUG:
-                plugin = read_null_terminated(self.stream)
-                version = read_null_terminated(self.stream)
-                self.on_requires_plugin(plugin, version)
-
-            # fileInfo
-            elif chunk.typeid == FINF:
-                key = read_null_terminated(self.stream)
-                value = read_null_terminated(self.stream)
-                self.on_file_info(key, value)
-
-            # on_current_unit callback is deferred until all three 
-            # angle, linear and time units are read from the stream.
-
-            # currentUnit (angle)
-            elif chunk.typeid == AUNI:
-                angle_unit = self._read_chunk_data(chunk)
-
-            # currentUnit (linear)
-            elif chunk.typeid == LUNI:
-                linear_unit = self._read_chunk_data(chunk)
-
-            # currentUnit (time)
-            elif chunk.typeid == TUNI:
-                time_unit = self._read_chunk_data(chunk)
-
-            # Got all three units
-            if angle_unit and linear_unit and time_unit:
-                self.on_current_unit(angle=angle_unit,
-                                     linear=linear_unit,
-                                     time=time_unit)
-                angle_unit = None
-                linear_unit = None
-                time_unit = None
+            handler = handlers.get(chunk.typeid)
+            if handler is not None:
+                handler(chunk)
+                continue
+
+            # currentUnit (angle, linear or time)
+            keyword = _UNIT_KEYWORDS.get(chunk.typeid)
+            if keyword is not None:
+                units[keyword] = self._read_chunk_data(chunk)
+                if len(units) == len(_UNIT_KEYWORDS):
+                    self.on_current_unit(**units)
+                    units = {}
 
         # Didn't get all three units (this is non standard)
-        if angle_unit or linear_unit or time_unit:
-            self.on_current_unit(angle=angle_unit,
-                                 linear=linear_unit,
-                                 time=time_unit)
+        if units:
+            self.on_current_unit(angle=units.get("angle"),
+                                 linear=units.get("linear"),
+                                 time=units.get("time"))
+
+    # requires (maya)
+    def __parse_requires_maya(self, chunk):
+        self.on_requires_maya(self._read_chunk_data(chunk))
+
+    # requires (plugin)
+    def __parse_requires_plugin(self, chunk):
+        plugin = read_null_terminated(self.stream)
+        version = read_null_terminated(self.stream)
+        self.on_requires_plugin(plugin, version)
+
+    # fileInfo
+    def __parse_file_info(self, chunk):
+        key = read_null_terminated(self.stream)
+        value = read_null_terminated(self.stream)
+        self.on_file_info(key, value)
 
     def _parse_file_reference(self):
         for chunk in self._iter_chunks(types=[FREF]):
@@ -182,41 +369,85 @@ class MayaBinaryParser(IffParser, MayaParserBase):
         self.on_connect_attr(src, dst)
 
     def _parse_node(self, mtypeid):
+        self.__node_mtypeid = mtypeid
+        self.__anim_curve = None
+
+        handlers = self.__node_handlers
         for chunk in self._iter_chunks():
-            # Create node
-            if chunk.typeid == CREA:
-                typename = self.__mtypeid_to_typename.get(mtypeid, "unknown")
-                name_parts = self._read_chunk_data(chunk)[1:-1].split("\0")
-                name = name_parts[0]
-                parent_name = name_parts[1] if len(name_parts) > 1 else None
-                self.on_create_node(typename, name, parent=parent_name)
-
-            # Select the current node
-            elif chunk.typeid == SLCT:
-                pass
-
-            # Dynamic attribute
-            elif chunk.typeid == ATTR:
-                pass
-
-            # Flags
-            elif chunk.typeid == FLGS:
-                pass
-
-            # Set attribute
+            handler = handlers.get(chunk.typeid)
+            if handler is not None:
+                handler(chunk)
             else:
-                self._parse_attribute(chunk.typeid)
-
-    def _parse_attribute(self, mtypeid):
-        # TODO Support more primitive types
-        if mtypeid == STR_:
-            self._parse_string_attribute()
-        elif mtypeid == DBLE:
-            self._parse_double_attribute()
-        elif mtypeid == DBL3:
-            self._parse_double3_attribute()
-        else:
-            self._parse_mpxdata_attribute(mtypeid)
+                self.__parse_unknown_attribute(chunk)
+
+        anim_curve = self.__anim_curve
+        if anim_curve is not None:
+            self.__anim_curve = None
+            self.on_anim_curve(anim_curve.curve())
+
+    # Create node
+    def __parse_create_node(self, chunk):
+        typename = self.__mtypeid_to_typename.get(self.__node_mtypeid)
+        if typename is None:
+            typename = self._unknown_node_type(self.__node_mtypeid)
+        name_parts = self._read_chunk_data(chunk)[1:-1].split("\0")
+        name = name_parts[0]
+        parent_name = name_parts[1] if len(name_parts) > 1 else None
+        if is_anim_curve_type(typename):
+            self.__anim_curve = AnimCurveDecoder(typename, name)
+        self.on_create_node(typename, name, parent=parent_name)
+
+    # Select the current node
+    def __parse_select(self, chunk):
+        self.on_select(self._read_chunk_data(chunk))
+
+    def __parse_unknown_attribute(self, chunk):
+        anim_curve = self.__anim_curve
+        if anim_curve is None or not self._parse_anim_curve_attribute(anim_curve):
+            self._parse_mpxdata_attribute(chunk.typeid)
+
+    def _parse_anim_curve_attribute(self, anim_curve):
+        # Per-key data is stored as packed arrays whose typeids vary with
+        # the curve type, so values are decoded based on the attribute name
+        # and the size of each element instead.
+        attr_name, count = self._parse_attribute_info()
+        if not anim_curve.accepts(attr_name):
+            self._set_offset(self.chunk.data_offset)
+            return False
+
+        offset = self._get_offset()
+        data = self.stream.read(self.chunk.data_offset + self.chunk.data_length - offset)
+        info = anim_curve.element_info(attr_name)
+        if info is None:
+            anim_curve.set_plug(attr_name, data[:1] not in ("", "\0"))
+            return True
+
+        # The element size follows from the number of elements in the plug
+        # name. Without it, e.g. 4 floats can't be told from 2 doubles, so
+        # such data is left to _parse_mpxdata_attribute.
+        width, typecode = info
+        formats = _KEY_VALUE_FORMATS[typecode]
+        size = None
+        if "[" in attr_name and count > 0:
+            element_size, remainder = divmod(len(data), count * width)
+            if not remainder:
+                size = element_size
+        if size not in formats:
+            self._set_offset(self.chunk.data_offset)
+            return False
+
+        values = struct.unpack(">%d%s" % (len(data) // size, formats[size]), data)
+        anim_curve.set_plug(attr_name, values)
+        return True
+
+    def _parse_attribute(self, mtypeid, typename, chunk=None):
+        # Set attribute
+        anim_curve = self.__anim_curve
+        if anim_curve is not None and self._parse_anim_curve_attribute(anim_curve):
+            return
+        attr_name, count = self._parse_attribute_info()
+        value = self._parse_attribute_value(mtypeid, count)
+        self.on_set_attr(attr_name, value, type=typename)
 
     def _parse_attribute_info(self):
         attr_name = read_null_terminated(self.stream)
@@ -224,33 +455,29 @@ class MayaBinaryParser(IffParser, MayaParserBase):
         count = plug_element_count(attr_name)
         return attr_name, count
 
-    def _parse_string_attribute(self):
-        attr_name, count = self._parse_attribute_info()
-        value = read_null_terminated(self.stream)
-        self.on_set_attr(attr_name, value, type="string")
-
-    def _parse_double_attribute(self):
-        attr_name, count = self._parse_attribute_info()
-        value = struct.unpack(">" + "d" * count,
-                              self.stream.read(8 * count))
-        value = value[0] if count == 1 else value
-        self.on_set_attr(attr_name, value, type="double")
-
-    def _parse_double3_attribute(self):
-        attr_name, count = self._parse_attribute_info()
-        value = struct.unpack(">" + "ddd" * count,
-                              self.stream.read(24 * count))
-        self.on_set_attr(attr_name, value, type="double3")
+    def _parse_attribute_value(self, mtypeid, count):
+        offset = self._get_offset()
+        length = self.chunk.data_offset + self.chunk.data_length - offset
+        if self.__lazy_values is not None:
+            return MayaLazyValue(self.__lazy_values, offset, length,
+                                 mtypeid, count)
+        return self.__value_decoders[mtypeid](self.stream.read(length), 0,
+                                              length, count)
 
     def _parse_mpxdata_attribute(self, tyepid):
         # TODO
         pass
 
+    def _parse_dynamic_attribute(self, chunk):
+        # TODO addAttr
+        pass
+
+    def _parse_node_flags(self, chunk):
+        pass
+
+    def _unknown_node_type(self, mtypeid):
+        # Typically a plugin node, the MTypeId is not in the database
+        return "unknown"
+
     def _load_mtypeid_database(self, path):
-        with open(path) as f:
-            line = f.readline()
-            while line:
-                mtypeid = be_word4(line[:4])
-                typename = line[5:].strip()
-                self.__mtypeid_to_typename[mtypeid] = typename
-                line = f.readline()
+        self.__mtypeid_to_typename.update(load_mtypeid_database(path))
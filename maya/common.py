@@ -1,3 +1,51 @@
+import struct
+from array import array
+from collections import namedtuple
+
+
+# Errors a damaged or unsupported scene may raise while being parsed
+PARSE_ERRORS = (IOError, OSError, ValueError, LookupError, RuntimeError,
+                struct.error)
+
+AnimCurve = namedtuple("AnimCurve", ["name",
+                                     "nodetype",
+                                     "times",
+                                     "values",
+                                     "in_tangent_types",
+                                     "out_tangent_types",
+                                     "in_tangent_x",
+                                     "in_tangent_y",
+                                     "out_tangent_x",
+                                     "out_tangent_y",
+                                     "weighted"])
+
+# Per-key attributes of animCurve nodes, mapped to the name of the
+# corresponding AnimCurve field(s) and the element type of their values.
+_ANIM_CURVE_KEY_ATTRIBUTES = {
+    "ktv": (("times", "values"), "d"),
+    "kit": (("in_tangent_types",), "h"),
+    "kot": (("out_tangent_types",), "h"),
+    "kix": (("in_tangent_x",), "d"),
+    "kiy": (("in_tangent_y",), "d"),
+    "kox": (("out_tangent_x",), "d"),
+    "koy": (("out_tangent_y",), "d"),
+}
+
+_ANIM_CURVE_ATTRIBUTE_ALIASES = {
+    "keyTimeValue": "ktv",
+    "keyTanInType": "kit",
+    "keyTanOutType": "kot",
+    "keyTanInX": "kix",
+    "keyTanInY": "kiy",
+    "keyTanOutX": "kox",
+    "keyTanOutY": "koy",
+}
+
+
+def is_anim_curve_type(nodetype):
+    return nodetype.startswith("animCurve")
+
+
 def plug_element_count(plug):
     lbracket = plug.rfind("[")
     if lbracket != -1:
@@ -10,6 +58,97 @@ def plug_element_count(plug):
     return 1
 
 
+def plug_element_start(plug):
+    lbracket = plug.rfind("[")
+    if lbracket != -1:
+        rbracket = plug.rfind("]")
+        if rbracket != -1 and lbracket < rbracket:
+            return int(plug[lbracket + 1:rbracket].split(":")[0])
+    return 0
+
+
+def _plug_attribute(plug):
+    attr = plug.lstrip(".")
+    lbracket = attr.find("[")
+    if lbracket != -1:
+        if not attr.endswith("]"):
+            # Child of an element, e.g. ".ktv[0].kv"
+            return None
+        attr = attr[:lbracket]
+    return _ANIM_CURVE_ATTRIBUTE_ALIASES.get(attr, attr)
+
+
+class AnimCurveDecoder(object):
+    """Collects the per-key attributes of an animCurve node into dense
+    arrays.
+
+    Keys may be set in any number of (possibly sparse) ranges. Tangent data
+    that was never set is reported as 0 (tangent types) or NaN.
+    """
+
+    def __init__(self, nodetype, name):
+        self.__nodetype = nodetype
+        self.__name = name
+        self.__arrays = {}
+        self.__weighted = False
+
+    def accepts(self, plug):
+        attr = _plug_attribute(plug)
+        return attr in _ANIM_CURVE_KEY_ATTRIBUTES or attr in ("wgt", "weightedTangents")
+
+    def element_info(self, plug):
+        """Return the number of values per key and their typecode, or None
+        if plug is not a per-key attribute."""
+        attr = _plug_attribute(plug)
+        if attr not in _ANIM_CURVE_KEY_ATTRIBUTES:
+            return None
+        fields, typecode = _ANIM_CURVE_KEY_ATTRIBUTES[attr]
+        return len(fields), typecode
+
+    def set_plug(self, plug, values):
+        attr = _plug_attribute(plug)
+        if attr in ("wgt", "weightedTangents"):
+            self.__weighted = bool(values[0] if isinstance(values, (tuple, list)) else values)
+            return
+
+        if not isinstance(values, (tuple, list, array)):
+            values = (values,)
+
+        width = len(_ANIM_CURVE_KEY_ATTRIBUTES[attr][0])
+        begin = plug_element_start(plug) * width
+        end = begin + len(values)
+
+        data = self.__arrays.get(attr)
+        if data is None:
+            data = self.__arrays[attr] = array("d")
+        if len(data) < end:
+            data.extend([float("nan")] * (end - len(data)))
+        data[begin:end] = array("d", values)
+
+    def curve(self):
+        keys = self.__arrays.get("ktv", array("d"))
+        count = len(keys) // 2
+        fields = {"times": keys[0:2 * count:2],
+                  "values": keys[1:2 * count:2]}
+
+        for attr, (names, typecode) in _ANIM_CURVE_KEY_ATTRIBUTES.items():
+            if attr == "ktv":
+                continue
+            data = self.__arrays.get(attr, array("d"))[:count]
+            missing = count - len(data)
+            if typecode == "d":
+                data.extend([float("nan")] * missing)
+            else:
+                data = array(typecode, [0 if v != v else int(v) for v in data])
+                data.extend([0] * missing)
+            fields[names[0]] = data
+
+        return AnimCurve(name=self.__name,
+                         nodetype=self.__nodetype,
+                         weighted=self.__weighted,
+                         **fields)
+
+
 class MayaParserBase(object):
 
     def on_requires_maya(self, version):
@@ -44,3 +183,8 @@ class MayaParserBase(object):
 
     def on_connect_attr(self, src_plug, dst_plug):
         pass
+
+    # Per-key attributes of animCurve nodes are reported here, once per
+    # node, rather than through on_set_attr.
+    def on_anim_curve(self, curve):
+        pass
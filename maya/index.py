@@ -0,0 +1,260 @@
+import os
+import re
+import sqlite3
+
+from common import *
+from ascii import MayaAsciiParser
+from binary import MayaBinaryParser, MayaBinaryError, scan_maya_binary
+from ..util.prefetch import ReadAheadScheduler
+
+
+# Term kinds stored in the index
+NODE_TYPE = "nodetype"
+NODE_NAME = "node"
+STRING_VALUE = "string"
+PLUGIN = "plugin"
+REFERENCE = "reference"
+
+TERM_KINDS = (NODE_TYPE, NODE_NAME, STRING_VALUE, PLUGIN, REFERENCE)
+
+SCENE_EXTENSIONS = (".ma", ".mb")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    file_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS terms_lookup ON terms (kind, value, file_id);
+CREATE INDEX IF NOT EXISTS terms_file ON terms (file_id);
+"""
+
+
+class _SceneTermCollector(MayaParserBase):
+
+    def on_requires_plugin(self, plugin, version):
+        self.terms.add((PLUGIN, plugin))
+
+    def on_file_reference(self, path):
+        self.terms.add((REFERENCE, path))
+
+    def on_create_node(self, nodetype, name, parent):
+        self.terms.add((NODE_TYPE, nodetype))
+        if name:
+            self.terms.add((NODE_NAME, name))
+
+    def on_set_attr(self, name, value, type):
+        if type == "string" and value:
+            self.terms.add((STRING_VALUE, value))
+
+
+class _AsciiTermParser(_SceneTermCollector, MayaAsciiParser):
+
+    def __init__(self, stream):
+        MayaAsciiParser.__init__(self, stream)
+        self.terms = set()
+
+
+class _BinaryTermParser(_SceneTermCollector, MayaBinaryParser):
+
+    def __init__(self, stream):
+        # Only string values are indexed, so the rest are never decoded
+        MayaBinaryParser.__init__(self, stream, lazy=True, cache_size=0)
+        self.terms = set()
+
+    def on_set_attr(self, name, value, type):
+        if type == "string":
+            _SceneTermCollector.on_set_attr(self, name, value.value, type)
+
+    def _unknown_node_type(self, mtypeid):
+        # Plugin node types are indexed by MTypeId instead of name
+        return "0x%08x" % mtypeid
+
+
+def is_scene_file(path):
+    return os.path.splitext(path)[1].lower() in SCENE_EXTENSIONS
+
+
+def iter_scene_files(roots):
+    for root in roots:
+        if os.path.isfile(root):
+            if is_scene_file(root):
+                yield os.path.abspath(root)
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                if is_scene_file(filename):
+                    yield os.path.abspath(os.path.join(dirpath, filename))
+
+
+def read_scene_terms(stream, path):
+    """Return the set of (kind, value) index terms found in a scene."""
+    if os.path.splitext(path)[1].lower() == ".ma":
+        parser = _AsciiTermParser(stream)
+    else:
+        # Reject damaged files before parsing them
+        report = scan_maya_binary(stream, max_damage=1)
+        if report.damage:
+            damage = report.damage[0]
+            raise MayaBinaryError, "%s at offset %d" % (damage.message,
+                                                        damage.offset)
+        parser = _BinaryTermParser(stream)
+    parser.parse()
+    return parser.terms
+
+
+def read_scene_file_terms(path):
+    """Stat and parse a scene file.
+
+    Returns a (path, stat, terms, error) tuple, where error is a message if
+    the file could not be parsed. Suitable for use with process pools.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        return path, None, (), str(e)
+
+    try:
+        with open(path, "rb") as stream:
+            terms = read_scene_terms(stream, path)
+    except PARSE_ERRORS as e:
+        return path, stat, (), str(e)
+    return path, stat, terms, None
+
+
+class SceneIndex(object):
+    """Inverted index from scene contents to file paths.
+
+    The index is kept in a local SQLite database. Each file is stored along
+    with its modification time and size, so that unchanged files are skipped
+    by subsequent updates.
+    """
+
+    def __init__(self, path):
+        self.__connection = sqlite3.connect(path)
+        self.__connection.text_factory = str
+        self.__connection.executescript(_SCHEMA)
+
+    @property
+    def connection(self):
+        return self.__connection
+
+    def close(self):
+        self.__connection.close()
+
+    def is_current(self, path, stat=None):
+        stat = stat or os.stat(path)
+        row = self.__connection.execute(
+            "SELECT mtime, size FROM files WHERE path = ?", (path,)).fetchone()
+        return row is not None and row == (stat.st_mtime, stat.st_size)
+
+    def update_file(self, path, terms, stat=None):
+        stat = stat or os.stat(path)
+        with self.__connection:
+            self.__remove_file(path)
+            cursor = self.__connection.execute(
+                "INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)",
+                (path, stat.st_mtime, stat.st_size))
+            file_id = cursor.lastrowid
+            self.__connection.executemany(
+                "INSERT INTO terms (kind, value, file_id) VALUES (?, ?, ?)",
+                ((kind, value, file_id) for kind, value in terms))
+
+    def remove_file(self, path):
+        with self.__connection:
+            self.__remove_file(path)
+
+    def update(self, paths, log=None, workers=4):
+        """Reparse and index every path that changed since it was indexed.
+
+        Changed files are read ahead on a pool of worker threads while
+        earlier files are parsed. Returns the number of files that were
+        (re)indexed.
+        """
+        changed = []
+        stats = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.remove_file(path)
+                continue
+
+            if not self.is_current(path, stat):
+                changed.append(path)
+                stats[path] = stat
+
+        for prefetched in ReadAheadScheduler(changed, workers=workers):
+            path = prefetched.path
+            try:
+                if prefetched.error:
+                    raise prefetched.error
+                terms = read_scene_terms(prefetched.stream, path)
+            except PARSE_ERRORS as e:
+                # Indexed without terms, so that it is not retried until
+                # it changes on disk
+                if log:
+                    log.write("%s: %s\n" % (path, e))
+                terms = ()
+
+            self.update_file(path, terms, stats[path])
+        return len(changed)
+
+    def prune(self, paths):
+        """Remove every indexed file that is not in paths."""
+        keep = set(paths)
+        stale = [path for path in self.iter_paths() if path not in keep]
+        with self.__connection:
+            for path in stale:
+                self.__remove_file(path)
+        return len(stale)
+
+    def iter_paths(self):
+        for row in self.__connection.execute("SELECT path FROM files"):
+            yield row[0]
+
+    def lookup(self, kind, value):
+        """Return the paths of all files containing the given term."""
+        return self.__query("t.value = ?", kind, value)
+
+    def search(self, kind, pattern):
+        """Return the paths of all files with a term matching a glob pattern."""
+        # Constrain the scan to the literal prefix of the pattern, so that
+        # the lookup index is used for e.g. "/textures/*".
+        prefix = re.split(r"[*?\[]", pattern, 1)[0]
+        if not prefix:
+            return self.__query("t.value GLOB ?", kind, pattern)
+        if prefix[-1] == "\xff":
+            return self.__query("t.value >= ? AND t.value GLOB ?",
+                                kind, prefix, pattern)
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return self.__query("t.value >= ? AND t.value < ? AND t.value GLOB ?",
+                            kind, prefix, upper, pattern)
+
+    def terms(self, path):
+        return self.__connection.execute(
+            "SELECT t.kind, t.value FROM terms AS t "
+            "JOIN files AS f ON f.id = t.file_id "
+            "WHERE f.path = ?", (path,)).fetchall()
+
+    def __query(self, condition, kind, *values):
+        if kind not in TERM_KINDS:
+            raise ValueError, "Unknown term kind: %s" % kind
+        rows = self.__connection.execute(
+            "SELECT DISTINCT f.path FROM terms AS t "
+            "JOIN files AS f ON f.id = t.file_id "
+            "WHERE t.kind = ? AND " + condition, (kind,) + values)
+        return [row[0] for row in rows]
+
+    def __remove_file(self, path):
+        row = self.__connection.execute(
+            "SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None:
+            self.__connection.execute("DELETE FROM terms WHERE file_id = ?", row)
+            self.__connection.execute("DELETE FROM files WHERE id = ?", row)
@@ -0,0 +1,402 @@
+import struct
+from collections import defaultdict
+
+from common import *
+from ascii import MayaAsciiParser
+from binary import *
+from ..util.common import align
+
+
+_CHUNK_HEADER_64 = struct.Struct(">L4xQ")
+_SIZE_64 = struct.Struct(">Q")
+
+
+class MayaBinaryWriter(object):
+    """Writes a 64-bit (FOR8) Maya binary file chunk by chunk.
+
+    Group sizes are written when the group ends, so the output stream must
+    be seekable. Only the offsets of the open groups are kept in memory.
+    """
+
+    def __init__(self, stream):
+        self.__stream = stream
+        self.__groups = []
+
+    @property
+    def depth(self):
+        return len(self.__groups)
+
+    def begin_group(self, form_type, typeid=FOR8):
+        start = self.__stream.tell()
+        self.__stream.write(_CHUNK_HEADER_64.pack(typeid, 0))
+        self.__stream.write(struct.pack(">L", form_type))
+        self.__groups.append(start)
+
+    def end_group(self):
+        stream = self.__stream
+        start = self.__groups.pop()
+        data_offset = start + _CHUNK_HEADER_64.size
+        end = stream.tell()
+
+        # Alignment is relative to the end of the group type
+        base = data_offset + 4
+        stream.write("\0" * (align(end - base, 8) - (end - base)))
+        padded_end = stream.tell()
+
+        stream.seek(start + 8)
+        stream.write(_SIZE_64.pack(end - data_offset))
+        stream.seek(padded_end)
+
+    def write_chunk(self, typeid, data):
+        self.__stream.write(_CHUNK_HEADER_64.pack(typeid, len(data)))
+        self.__stream.write(data)
+        self.__stream.write("\0" * (align(len(data), 8) - len(data)))
+
+    def close(self):
+        while self.__groups:
+            self.end_group()
+
+
+def _numbers(value):
+    if isinstance(value, (tuple, list)):
+        return [float(v) for v in value]
+    return [float(value)]
+
+
+def _is_integer_token(token):
+    try:
+        int(token)
+        return True
+    except ValueError:
+        return False
+
+
+# Command flags whose information is not transcoded to Maya binary
+_DROPPED_FLAGS = {
+    "file": frozenset(["-ns", "--namespace", "-rfn", "--referenceNode",
+                       "-dr", "--deferReference", "-rdi", "--referenceDepthInfo",
+                       "-op", "-options", "-typ", "-type", "-shd", "-sharedNodes"]),
+    "createNode": frozenset(["-s", "--shared"]),
+    "connectAttr": frozenset(["-l", "--lock", "-na", "--nextAvailable",
+                              "-rd", "--referenceDest"]),
+}
+
+
+class MayaAsciiToBinaryTranscoder(MayaAsciiParser):
+    """Streams the commands of a Maya ASCII file into a Maya binary file.
+
+    Header information, file references, node creation and selection,
+    string, double and double3 attribute values and connections are
+    transcoded. Everything else is counted in skipped, by command or kind,
+    as are flags that are dropped and values whose type may not be kept.
+    """
+
+    def __init__(self, stream, output):
+        MayaAsciiParser.__init__(self, stream)
+        self.__writer = MayaBinaryWriter(output)
+        self.__typeids = dict((typename, mtypeid) for mtypeid, typename
+                              in load_mtypeid_database(MAYA_2012_TYPEIDS).iteritems())
+        self.__in_header = False
+        self.__in_body = False
+        self.__in_node = False
+        self.__references = []
+        self.__set_attr_args = ()
+        self.skipped = defaultdict(int)
+
+    def transcode(self):
+        self.__writer.begin_group(MAYA)
+        self.parse()
+        self.__begin_body()
+        self.__end_node()
+        self.__writer.close()
+        return dict(self.skipped)
+
+    def has_command(self, command):
+        # Unsupported commands are tokenized too, so that they are counted
+        return True
+
+    def exec_command(self, command, args):
+        if MayaAsciiParser.has_command(self, command):
+            dropped_flags = _DROPPED_FLAGS.get(command, ())
+            for arg in args:
+                if arg in dropped_flags:
+                    self.skipped["%s %s" % (command, arg)] += 1
+            if command == "setAttr":
+                self.__set_attr_args = args
+            MayaAsciiParser.exec_command(self, command, args)
+        else:
+            self.skipped[command] += 1
+
+    def on_requires_maya(self, version):
+        self.__write_header_chunk(VERS, version)
+
+    def on_requires_plugin(self, plugin, version):
+        self.__write_header_chunk(PLUG, "%s\0%s\0" % (plugin, version))
+
+    def on_file_info(self, key, value):
+        self.__write_header_chunk(FINF, "%s\0%s\0" % (key, value))
+
+    def on_current_unit(self, angle, linear, time):
+        for typeid, unit in ((AUNI, angle), (LUNI, linear), (TUNI, time)):
+            if unit:
+                self.__write_header_chunk(typeid, unit)
+
+    def on_file_reference(self, path):
+        # References precede the header in .ma files but follow it in .mb
+        # files, so they are held until the header is complete.
+        if self.__in_body:
+            self.__write_references([path])
+        else:
+            self.__references.append(path)
+
+    def on_create_node(self, nodetype, name, parent):
+        self.__begin_body()
+        mtypeid = self.__typeids.get(nodetype)
+        if mtypeid is None:
+            self.skipped["createNode " + nodetype] += 1
+            return
+
+        self.__writer.begin_group(mtypeid)
+        self.__in_node = True
+        data = "\0" + (name or "") + "\0"
+        if parent:
+            data += parent + "\0"
+        self.__writer.write_chunk(CREA, data)
+
+    def on_select(self, name):
+        self.__begin_body()
+        self.__writer.begin_group(SLCT)
+        self.__in_node = True
+        self.__writer.write_chunk(SLCT, name)
+
+    def on_set_attr(self, name, value, type):
+        if not self.__in_node:
+            self.skipped["setAttr"] += 1
+            return
+
+        try:
+            if type == "string":
+                typeid, data = STR_, value + "\0"
+            elif type is None:
+                raw_values = value if isinstance(value, tuple) else (value,)
+                if any(isinstance(v, bool) for v in raw_values):
+                    self.skipped["setAttr bool"] += 1
+                    return
+                # Readers decode as many elements as the plug names, so
+                # values that fit neither doubles nor double3s are lost.
+                values = _numbers(value)
+                count = plug_element_count(name)
+                if len(values) == count:
+                    typeid = DBLE
+                elif len(values) == 3 * count:
+                    typeid = DBL3
+                else:
+                    self.skipped["setAttr (value count)"] += 1
+                    return
+                # Integers and integral doubles look the same in .ma files,
+                # both are written as doubles.
+                tokens = self.__set_attr_args[-len(raw_values):]
+                if any(_is_integer_token(token) for token in tokens):
+                    self.skipped["setAttr integer (written as double)"] += 1
+                data = struct.pack(">%dd" % len(values), *values)
+            elif type == "double3":
+                values = _numbers(value)
+                if len(values) != 3 * plug_element_count(name):
+                    self.skipped["setAttr -type double3 (value count)"] += 1
+                    return
+                typeid, data = DBL3, struct.pack(">%dd" % len(values), *values)
+            else:
+                self.skipped["setAttr -type " + type] += 1
+                return
+        except (TypeError, ValueError):
+            self.skipped["setAttr"] += 1
+            return
+
+        self.__writer.write_chunk(typeid, name + "\0\0" + data)
+
+    def on_set_attr_flags(self, plug, keyable=None, channelbox=None, lock=None):
+        self.skipped["setAttr flags"] += 1
+
+    def on_anim_curve(self, curve):
+        # The binary typeids of per-key data are not known
+        self.skipped["animCurve keys"] += 1
+
+    def on_connect_attr(self, src_plug, dst_plug):
+        self.__begin_body()
+        self.__writer.begin_group(CONN)
+        self.__writer.write_chunk(CONN, "\0%s\0%s\0" % (src_plug, dst_plug))
+        self.__writer.end_group()
+
+    def __write_header_chunk(self, typeid, data):
+        if self.__in_body:
+            # Header information after the first node is rare, but can
+            # still be stored in a separate header group.
+            self.__end_node()
+            self.__writer.begin_group(HEAD)
+            self.__writer.write_chunk(typeid, data)
+            self.__writer.end_group()
+            return
+
+        if not self.__in_header:
+            self.__writer.begin_group(HEAD)
+            self.__in_header = True
+        self.__writer.write_chunk(typeid, data)
+
+    def __write_references(self, paths):
+        self.__end_node()
+        self.__writer.begin_group(FREF)
+        for path in paths:
+            self.__writer.write_chunk(FREF, path + "\0")
+        self.__writer.end_group()
+
+    def __begin_body(self):
+        self.__end_node()
+        if self.__in_body:
+            return
+        self.__in_body = True
+        if self.__in_header:
+            self.__writer.end_group()
+            self.__in_header = False
+        if self.__references:
+            self.__write_references(self.__references)
+            self.__references = []
+
+    def __end_node(self):
+        if self.__in_node:
+            self.__writer.end_group()
+            self.__in_node = False
+
+
+def _quote(value):
+    return '"%s"' % (value.replace("\\", "\\\\")
+                          .replace('"', '\\"')
+                          .replace("\n", "\\n"))
+
+
+def _format_number(value):
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if abs(value) < 1e15 and value == int(value):
+        return "%d" % value
+    return repr(value)
+
+
+def _format_numbers(values):
+    if isinstance(values, (bool, int, long, float)):
+        values = (values,)
+    return " ".join(_format_number(v) for v in values)
+
+
+class MayaBinaryToAsciiTranscoder(MayaBinaryParser):
+    """Streams the chunks of a Maya binary file into a Maya ASCII file.
+
+    Supports the same data as MayaAsciiToBinaryTranscoder, plus animation
+    curve keys. Attribute values of other types are counted in skipped, by
+    typeid, as are dynamic attributes, node flags and nodes whose MTypeId
+    is not known.
+    """
+
+    def __init__(self, stream, output):
+        MayaBinaryParser.__init__(self, stream)
+        self.__output = output
+        self.skipped = defaultdict(int)
+
+    def transcode(self):
+        self.__output.write("//Maya ASCII scene\n")
+        self.parse()
+        return dict(self.skipped)
+
+    def on_requires_maya(self, version):
+        self.__write("requires maya %s;" % _quote(version))
+
+    def on_requires_plugin(self, plugin, version):
+        self.__write("requires %s %s;" % (_quote(plugin), _quote(version)))
+
+    def on_file_info(self, key, value):
+        self.__write("fileInfo %s %s;" % (_quote(key), _quote(value)))
+
+    def on_current_unit(self, angle, linear, time):
+        args = ""
+        for flag, unit in (("-l", linear), ("-a", angle), ("-t", time)):
+            if unit:
+                args += " %s %s" % (flag, unit)
+        self.__write("currentUnit%s;" % args)
+
+    def on_file_reference(self, path):
+        self.__write("file -r %s;" % _quote(path))
+
+    def on_create_node(self, nodetype, name, parent):
+        line = "createNode %s -n %s" % (nodetype, _quote(name))
+        if parent:
+            line += " -p %s" % _quote(parent)
+        self.__write(line + ";")
+
+    def on_select(self, name):
+        self.__write("select -ne %s;" % name)
+
+    def on_set_attr(self, name, value, type):
+        if type == "string":
+            self.__write('\tsetAttr %s -type "string" %s;' % (_quote(name), _quote(value)))
+        elif type == "double3":
+            self.__write('\tsetAttr %s -type "double3" %s;' % (
+                _quote(name), _format_numbers(value)))
+        elif type == "double":
+            self.__write("\tsetAttr %s %s;" % (_quote(name), _format_numbers(value)))
+        else:
+            # Registered plugin data types
+            self.skipped["setAttr -type " + type] += 1
+
+    def on_anim_curve(self, curve):
+        count = len(curve.times)
+        if not count:
+            return
+        plug_range = "[0:%d]" % (count - 1)
+        keys = []
+        for time, value in zip(curve.times, curve.values):
+            keys.append(_format_number(time))
+            keys.append(_format_number(value))
+        self.__write('\tsetAttr -s %d ".ktv%s" %s;' % (count, plug_range, " ".join(keys)))
+
+        for attr, values in (("kit", curve.in_tangent_types),
+                             ("kot", curve.out_tangent_types),
+                             ("kix", curve.in_tangent_x),
+                             ("kiy", curve.in_tangent_y),
+                             ("kox", curve.out_tangent_x),
+                             ("koy", curve.out_tangent_y)):
+            # Tangents that were never set are reported as 0 for tangent
+            # types and NaN for everything else
+            tangent_types = attr in ("kit", "kot")
+            unset = 0 if tangent_types else float("nan")
+            start = None
+            for i, value in enumerate(list(values) + [unset]):
+                is_set = value != 0 if tangent_types else value == value
+                if is_set and start is None:
+                    start = i
+                elif not is_set and start is not None:
+                    self.__write('\tsetAttr -s %d ".%s[%d:%d]" %s;' % (
+                        i - start, attr, start, i - 1,
+                        _format_numbers(values[start:i])))
+                    start = None
+
+        if curve.weighted:
+            self.__write('\tsetAttr ".wgt" yes;')
+
+    def on_connect_attr(self, src_plug, dst_plug):
+        self.__write("connectAttr %s %s;" % (_quote(src_plug), _quote(dst_plug)))
+
+    def _parse_mpxdata_attribute(self, typeid):
+        self.skipped[struct.pack(">L", typeid)] += 1
+
+    def _parse_dynamic_attribute(self, chunk):
+        self.skipped["addAttr"] += 1
+
+    def _parse_node_flags(self, chunk):
+        self.skipped["createNode flags"] += 1
+
+    def _unknown_node_type(self, mtypeid):
+        self.skipped["createNode 0x%08x" % mtypeid] += 1
+        return MayaBinaryParser._unknown_node_type(self, mtypeid)
+
+    def __write(self, line):
+        self.__output.write(line)
+        self.__output.write("\n")
@@ -0,0 +1,230 @@
+import re
+import struct
+
+from common import *
+from binary import *
+from binary import _read_maya_binary_format
+from ..util.common import align
+
+
+# Usage categories
+NODE_TYPE = "nodetype"
+NODE_NAME = "node"
+ATTRIBUTE_TYPE = "attribute"
+COMMAND = "command"
+
+# Chunks of a node form that don't hold attribute values
+_NODE_CHUNK_TYPES = frozenset([CREA, SLCT, FLGS, ATTR])
+
+# Commands that belong to the node created or selected before them. Maya
+# 2016 and later write "rename -uid" right after each createNode.
+_NODE_COMMANDS = frozenset(["setAttr", "addAttr", "rename", "lockNode"])
+
+_NODE_NAME_RE = re.compile(r'(?:^|\s)-(?:n|name)\s+"([^"]*)"')
+
+
+class ByteUsage(object):
+    """Bytes and chunk (or command) counts aggregated by category and key.
+
+    If the file is damaged, error describes why the walk stopped and only
+    the bytes read before are aggregated.
+    """
+
+    def __init__(self):
+        self.total_bytes = 0
+        self.error = None
+        self.__tables = {}
+
+    @property
+    def categories(self):
+        return sorted(self.__tables)
+
+    def add(self, category, key, size):
+        table = self.__tables.get(category)
+        if table is None:
+            table = self.__tables[category] = {}
+        entry = table.get(key)
+        if entry is None:
+            table[key] = [size, 1]
+        else:
+            entry[0] += size
+            entry[1] += 1
+
+    def top(self, category, count=None):
+        """Return (key, bytes, count) tuples, largest first."""
+        table = self.__tables.get(category, {})
+        entries = sorted(((key, size, n) for key, (size, n) in table.iteritems()),
+                         key=lambda entry: entry[1], reverse=True)
+        return entries[:count] if count is not None else entries
+
+
+def _typeid_string(typeid):
+    return struct.pack(">L", typeid)
+
+
+class MayaBinaryUsageProfiler(MayaBinaryParser):
+    """Aggregates the size of a Maya binary file by node type, node name and
+    attribute typeid.
+
+    Only chunk headers and node names are read, attribute values are
+    skipped over.
+    """
+
+    def __init__(self, stream):
+        format = _read_maya_binary_format(stream)
+        MayaBinaryParser.__init__(self, stream)
+        self.__typenames = load_mtypeid_database(MAYA_2012_TYPEIDS)
+        self.__header_size = (max(format.typeid_bytes, format.header_alignment) +
+                              max(format.size_bytes, format.header_alignment))
+        self.__alignment = format.chunk_alignment
+        self.__usage = ByteUsage()
+
+    def profile(self):
+        self.stream.seek(0, 2)
+        self.__usage.total_bytes = self.stream.tell()
+        try:
+            self.parse()
+            self.__check_file_size()
+        except (IffError, struct.error) as e:
+            # struct.error when cut off inside a form header
+            self.__usage.error = str(e)
+        return self.__usage
+
+    def __check_file_size(self):
+        # Files cut off between two nodes still parse, only the length of
+        # the top level form tells that the rest is missing.
+        self.stream.seek(0)
+        typeid, length = self._read_next_chunk_header()
+        if self.__header_size + length > self.__usage.total_bytes:
+            raise IffError, "Iff: Chunk at offset 0 is truncated"
+
+    def _parse_maya_header(self):
+        self._profile_form("<header>", None, attributes=False)
+
+    def _parse_file_reference(self):
+        self._profile_form("<references>", None, attributes=False)
+
+    def _parse_connection(self):
+        self._profile_form("<connections>", None, attributes=False)
+
+    def _parse_node(self, mtypeid):
+        typename = self.__typenames.get(mtypeid) or _typeid_string(mtypeid)
+        self._profile_form(typename, "<unnamed>")
+
+    def _profile_form(self, typename, name, attributes=True):
+        usage = self.__usage
+        header_size = self.__header_size
+        alignment = self.__alignment
+
+        form = self.chunk
+        form_start = form.data_offset - header_size
+        form_size = header_size + 4 + align(form.data_length - 4, alignment)
+        form_end = min(form.data_offset + form.data_length, usage.total_bytes)
+        error = None
+        if form_start + form_size > usage.total_bytes:
+            error = "Iff: Chunk at offset %d is truncated" % form_start
+
+        # Children are walked directly rather than with _iter_chunks, which
+        # dominates the cost of a pass that skips all attribute data.
+        stream = self.stream
+        offset = self._get_offset()
+        while form_end - offset >= header_size:
+            stream.seek(offset)
+            typeid, length = self._read_next_chunk_header()
+            if offset + header_size + length > form_end:
+                error = "Iff: Chunk at offset %d exceeds parent bounds" % offset
+                break
+            if name is not None:
+                if typeid == CREA:
+                    name = stream.read(length)[1:].split("\0", 1)[0]
+                elif typeid == SLCT:
+                    name = stream.read(length)
+            size = header_size + align(length, alignment)
+            if attributes and typeid not in _NODE_CHUNK_TYPES:
+                usage.add(ATTRIBUTE_TYPE, _typeid_string(typeid), size)
+            offset += size
+
+        if error:
+            # Only the chunks read so far are accounted for
+            form_size = offset - form_start
+        usage.add(NODE_TYPE, typename, form_size)
+        if name is not None:
+            usage.add(NODE_NAME, name, form_size)
+        if error:
+            raise IffError, error
+
+
+class MayaAsciiUsageProfiler(object):
+    """Aggregates the size of a Maya ASCII file by command, and the size of
+    each createNode block (the command and the setAttr/addAttr commands
+    following it) by node type and node name.
+
+    Commands are only split, not tokenized.
+    """
+
+    def __init__(self, stream):
+        self.__stream = stream
+
+    def profile(self):
+        usage = ByteUsage()
+        add = usage.add
+
+        command = None
+        command_size = 0
+        node_key = None
+        node_size = 0
+
+        for line in self.__stream:
+            size = len(line)
+            usage.total_bytes += size
+
+            if command is None:
+                if line.startswith("//"):
+                    add(COMMAND, "<comment>", size)
+                    continue
+                stripped = line.strip()
+                if not stripped:
+                    add(COMMAND, "<whitespace>", size)
+                    continue
+
+                command, _, args = stripped.partition(" ")
+                command = command.rstrip(";")
+                command_size = 0
+
+                if command == "createNode" or command == "select":
+                    if node_key is not None:
+                        add(NODE_TYPE, node_key[0], node_size)
+                        add(NODE_NAME, node_key[1], node_size)
+                    node_key = self.__node_key(command, args)
+                    node_size = 0
+                elif command not in _NODE_COMMANDS and node_key is not None:
+                    add(NODE_TYPE, node_key[0], node_size)
+                    add(NODE_NAME, node_key[1], node_size)
+                    node_key = None
+
+            command_size += size
+            if node_key is not None:
+                node_size += size
+
+            if line.rstrip().endswith(";"):
+                add(COMMAND, command, command_size)
+                command = None
+
+        if command is not None:
+            add(COMMAND, command, command_size)
+        if node_key is not None:
+            add(NODE_TYPE, node_key[0], node_size)
+            add(NODE_NAME, node_key[1], node_size)
+
+        return usage
+
+    def __node_key(self, command, args):
+        match = _NODE_NAME_RE.search(args)
+        if command == "createNode":
+            nodetype = args.split(" ", 1)[0].rstrip(";")
+            name = match.group(1) if match else "<unnamed>"
+        else:
+            # Existing node, e.g. select -ne :time1;
+            nodetype = "<selected>"
+            name = args.rstrip(";").split()[-1] if args.strip(" ;") else "<none>"
+        return nodetype, name
@@ -0,0 +1,178 @@
+import os
+import time
+import multiprocessing
+
+from index import is_scene_file, iter_scene_files, read_scene_file_terms
+from ..util.inotify import *
+
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE |
+              IN_CREATE | IN_ONLYDIR)
+
+
+class SceneWatcher(object):
+    """Keeps a SceneIndex current by watching scene directories.
+
+    Changes are picked up through inotify. A scene is reparsed once no
+    event has touched it for debounce seconds, which also covers Maya
+    saving through a temporary file that is renamed over the scene.
+    Scenes are parsed on a pool of worker processes; the index itself is
+    only updated from the thread calling poll().
+    """
+
+    def __init__(self, index, roots, workers=4, debounce=1.0, log=None):
+        self.__index = index
+        self.__roots = [os.path.abspath(root) for root in roots]
+        self.__debounce = debounce
+        self.__log = log
+        self.__pool = multiprocessing.Pool(workers) if workers > 0 else None
+        self.__inotify = Inotify()
+        self.__directories = {}
+        self.__pending = {}
+
+        for root in self.__roots:
+            self.__watch_tree(root)
+
+    def close(self):
+        if self.__pool is not None:
+            self.__pool.terminate()
+            self.__pool.join()
+            self.__pool = None
+        self.__inotify.close()
+
+    def on_file_indexed(self, path):
+        pass
+
+    def on_file_removed(self, path):
+        pass
+
+    @property
+    def pending(self):
+        return len(self.__pending)
+
+    def sync(self):
+        """Reparse all changed scenes below the roots and remove the ones
+        that no longer exist. Returns the number of files processed."""
+        paths = set(iter_scene_files(self.__roots))
+        changed = [path for path in paths if not self.__is_current(path)]
+        stale = [path for path in self.__index.iter_paths()
+                 if path not in paths and self.__is_below_roots(path)]
+        self.__process(changed + stale)
+        return len(changed) + len(stale)
+
+    def run(self):
+        self.sync()
+        while True:
+            self.poll()
+
+    def poll(self, timeout=None):
+        """Handle file system events for up to timeout seconds, and process
+        the scenes that settled in the meantime. Returns the number of
+        scenes processed."""
+        now = time.time()
+        if self.__pending:
+            wait = max(0.0, min(self.__pending.itervalues()) - now)
+            if timeout is not None:
+                wait = min(wait, timeout)
+        else:
+            wait = timeout
+
+        for event in self.__inotify.read_events(wait):
+            self.__handle_event(event)
+
+        now = time.time()
+        due = [path for path, deadline in self.__pending.iteritems()
+               if deadline <= now]
+        for path in due:
+            del self.__pending[path]
+        self.__process(due)
+        return len(due)
+
+    def __handle_event(self, event):
+        if event.mask & IN_Q_OVERFLOW:
+            # Events were lost, fall back to comparing the index with disk
+            self.sync()
+            return
+
+        directory = self.__directories.get(event.wd)
+        if directory is None:
+            return
+        if event.mask & IN_IGNORED:
+            del self.__directories[event.wd]
+            return
+
+        path = os.path.join(directory, event.name)
+        if event.mask & IN_ISDIR:
+            if event.mask & (IN_CREATE | IN_MOVED_TO):
+                # Scenes may have been written before the watch was added
+                self.__watch_tree(path)
+                for scene_path in iter_scene_files([path]):
+                    self.__schedule(scene_path)
+            elif event.mask & (IN_MOVED_FROM | IN_DELETE):
+                if event.mask & IN_MOVED_FROM:
+                    # The watches follow the directory to its new place
+                    self.__unwatch_tree(path)
+                prefix = path + os.sep
+                for scene_path in self.__index.iter_paths():
+                    if scene_path.startswith(prefix):
+                        self.__schedule(scene_path)
+
+        elif is_scene_file(event.name):
+            if event.mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE):
+                self.__schedule(path)
+
+    def __schedule(self, path):
+        self.__pending[path] = time.time() + self.__debounce
+
+    def __process(self, paths):
+        if not paths:
+            return
+
+        if self.__pool is not None and len(paths) > 1:
+            results = self.__pool.imap_unordered(read_scene_file_terms, paths)
+        else:
+            results = (read_scene_file_terms(path) for path in paths)
+
+        for path, stat, terms, error in results:
+            if stat is None:
+                self.__index.remove_file(path)
+                self.on_file_removed(path)
+                continue
+            if error and self.__log:
+                self.__log.write("%s: %s\n" % (path, error))
+            self.__index.update_file(path, terms, stat)
+            self.on_file_indexed(path)
+
+    def __watch_tree(self, root):
+        for dirpath, dirnames, filenames in os.walk(root):
+            try:
+                wd = self.__inotify.add_watch(dirpath, WATCH_MASK)
+            except InotifyError as e:
+                if self.__log:
+                    self.__log.write("%s: %s\n" % (dirpath, e))
+                continue
+            self.__directories[wd] = dirpath
+
+    def __unwatch_tree(self, root):
+        prefix = root + os.sep
+        for wd, directory in self.__directories.items():
+            if directory == root or directory.startswith(prefix):
+                del self.__directories[wd]
+                try:
+                    self.__inotify.remove_watch(wd)
+                except InotifyError:
+                    # Already removed along with the directory
+                    pass
+
+    def __is_current(self, path):
+        try:
+            return self.__index.is_current(path)
+        except OSError:
+            # Deleted since it was listed, __process removes it
+            return False
+
+    def __is_below_roots(self, path):
+        for root in self.__roots:
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return True
+        return False
@@ -25,12 +25,18 @@ class TestMayaAsciiParser(MayaAsciiParser):
     def on_create_node(self, nodetype, name, parent):
         print "Create Node: Type=%s Name=%s Parent=%s" % (nodetype, name, parent)
 
+    def on_select(self, name):
+        print "Select: %s" % name
+
     def on_set_attr(self, name, value, type):
         print "Set Attribute: [%s] %s=%s" % (type, name, repr(value))
 
     def on_connect_attr(self, src, dst):
         print "Connect Attributes: %s => %s" % (src, dst)
 
+    def on_anim_curve(self, curve):
+        print "Anim Curve: Type=%s Name=%s Keys=%d" % (curve.nodetype, curve.name, len(curve.times))
+
 
 test = TestMayaAsciiParser(stream=open(sys.argv[1]))
 test.parse()
@@ -0,0 +1,40 @@
+import sys
+import time
+from cStringIO import StringIO
+from sansapp.maya.binary import MayaBinaryParser
+
+
+RUNS = 5
+
+
+class ChunkCounter(MayaBinaryParser):
+
+    def __init__(self, stream, lazy):
+        MayaBinaryParser.__init__(self, stream, lazy=lazy, cache_size=0)
+        self.chunks = 0
+
+    def _read_next_chunk(self):
+        chunk = MayaBinaryParser._read_next_chunk(self)
+        if chunk:
+            self.chunks += 1
+        return chunk
+
+
+for path in sys.argv[1:]:
+    with open(path, "rb") as f:
+        data = f.read()
+
+    counter = ChunkCounter(StringIO(data), lazy=True)
+    counter.parse()
+
+    for lazy in (False, True):
+        best = None
+        for run in range(RUNS):
+            parser = MayaBinaryParser(StringIO(data), lazy=lazy, cache_size=0)
+            start = time.time()
+            parser.parse()
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print "%s (%s): %d chunks in %.3fs, %.2fus per chunk" % (
+            path, "lazy" if lazy else "eager", counter.chunks, best,
+            1e6 * best / counter.chunks)
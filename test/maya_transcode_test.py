@@ -0,0 +1,96 @@
+import sys
+import difflib
+from array import array
+from cStringIO import StringIO
+from sansapp.maya import MayaAsciiParser, MayaBinaryParser
+from sansapp.maya.transcode import MayaAsciiToBinaryTranscoder, MayaBinaryToAsciiTranscoder
+
+
+def _normalize_value(value, type):
+    if type == "string":
+        return repr(value)
+    if not isinstance(value, (tuple, list)):
+        value = (value,)
+    return " ".join(repr(float(v)) for v in value)
+
+
+class EventRecorder(object):
+
+    def on_requires_maya(self, version):
+        self.events.append("requires maya %s" % version)
+
+    def on_requires_plugin(self, plugin, version):
+        self.events.append("requires %s %s" % (plugin, version))
+
+    def on_file_info(self, key, value):
+        self.events.append("fileInfo %s %s" % (key, value))
+
+    def on_current_unit(self, angle, linear, time):
+        self.events.append("currentUnit %s %s %s" % (angle, linear, time))
+
+    def on_file_reference(self, path):
+        self.events.append("file %s" % path)
+
+    def on_create_node(self, nodetype, name, parent):
+        self.events.append("createNode %s %s %s" % (nodetype, name, parent))
+
+    def on_select(self, name):
+        self.events.append("select %s" % name)
+
+    def on_set_attr(self, name, value, type):
+        # Untyped, double and double3 values are all stored as doubles
+        self.events.append("setAttr %s %s" % (name, _normalize_value(value, type)))
+
+    def on_connect_attr(self, src, dst):
+        self.events.append("connectAttr %s %s" % (src, dst))
+
+    def on_anim_curve(self, curve):
+        fields = [list(field) if isinstance(field, array) else field for field in curve]
+        self.events.append("animCurve %r" % (fields,))
+
+
+class AsciiEventRecorder(EventRecorder, MayaAsciiParser):
+
+    def __init__(self, stream):
+        MayaAsciiParser.__init__(self, stream)
+        self.events = []
+
+
+class BinaryEventRecorder(EventRecorder, MayaBinaryParser):
+
+    def __init__(self, stream):
+        MayaBinaryParser.__init__(self, stream)
+        self.events = []
+
+
+def record_events(recorder_class, data):
+    recorder = recorder_class(StringIO(data))
+    recorder.parse()
+    return recorder.events
+
+
+path = sys.argv[1]
+with open(path, "rb") as f:
+    data = f.read()
+
+if path.lower().endswith(".ma"):
+    recorders = AsciiEventRecorder, BinaryEventRecorder
+    transcoder_class = MayaAsciiToBinaryTranscoder
+else:
+    recorders = BinaryEventRecorder, AsciiEventRecorder
+    transcoder_class = MayaBinaryToAsciiTranscoder
+
+output = StringIO()
+skipped = transcoder_class(StringIO(data), output).transcode()
+before = record_events(recorders[0], data)
+after = record_events(recorders[1], output.getvalue())
+
+for kind, count in sorted(skipped.items()):
+    print "Skipped: %d x %s" % (count, kind)
+for line in difflib.unified_diff(before, after, "before", "after", lineterm=""):
+    print line
+
+# Everything that differs must have been counted as skipped
+if before != after and not skipped:
+    print "Events changed, but nothing was counted as skipped"
+    sys.exit(1)
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+from sansapp.maya.index import SceneIndex
+from sansapp.maya.watch import SceneWatcher
+
+
+SAVES = 200
+DIRECTORIES = 8
+DEBOUNCE = 0.2
+
+template = sys.argv[1]
+extension = os.path.splitext(template)[1]
+root = tempfile.mkdtemp()
+
+
+class TimingSceneWatcher(SceneWatcher):
+
+    def __init__(self, *args, **kwargs):
+        SceneWatcher.__init__(self, *args, **kwargs)
+        self.saved = {}
+        self.latencies = []
+
+    def on_file_indexed(self, path):
+        saved = self.saved.pop(path, None)
+        if saved is not None:
+            self.latencies.append(time.time() - saved)
+
+
+def save_scenes(watcher):
+    # Maya writes to a temporary file and renames it over the scene
+    for i in range(SAVES):
+        directory = os.path.join(root, "shot%02d" % (i % DIRECTORIES))
+        if not os.path.isdir(directory):
+            os.mkdir(directory)
+        path = os.path.join(directory, "scene%03d%s" % (i % 50, extension))
+        temp_path = path + ".swp"
+        shutil.copyfile(template, temp_path)
+        os.rename(temp_path, path)
+        watcher.saved[path] = time.time()
+        time.sleep(0.002)
+
+
+try:
+    for workers in (0, 1, 4):
+        scene_index = SceneIndex(":memory:")
+        watcher = TimingSceneWatcher(scene_index, [root], workers=workers,
+                                     debounce=DEBOUNCE)
+        watcher.sync()
+        start = time.time()
+        saver = threading.Thread(target=save_scenes, args=(watcher,))
+        saver.start()
+        while saver.is_alive() or watcher.pending or watcher.saved:
+            watcher.poll(0.05)
+        elapsed = time.time() - start
+        latencies = sorted(watcher.latencies)
+        watcher.close()
+        scene_index.close()
+        if not latencies:
+            print "%d workers: %d saves, none reparsed" % (workers, SAVES)
+            continue
+        print "%d workers: %d saves, %d reparsed in %.3fs, latency median %.3fs max %.3fs" % (
+            workers, SAVES, len(latencies), elapsed,
+            latencies[len(latencies) // 2], latencies[-1])
+finally:
+    shutil.rmtree(root)
@@ -0,0 +1,23 @@
+import sys
+import time
+from sansapp.maya.index import iter_scene_files, read_scene_terms
+from sansapp.util.prefetch import ReadAheadScheduler, ThrottledFile
+
+
+LATENCY = 0.005
+BLOCK_SIZE = 1 << 20
+
+paths = list(iter_scene_files(sys.argv[1:]))
+open_slow = lambda path: ThrottledFile(open(path, "rb"), latency=LATENCY)
+
+for workers in (1, 2, 4, 8, 16):
+    start = time.time()
+    for prefetched in ReadAheadScheduler(paths, workers=workers,
+                                         block_size=BLOCK_SIZE,
+                                         open_file=open_slow):
+        if prefetched.stream is not None:
+            try:
+                read_scene_terms(prefetched.stream, prefetched.path)
+            except Exception:
+                pass
+    print "%2d workers: %d files in %.3fs" % (workers, len(paths), time.time() - start)
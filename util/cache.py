@@ -0,0 +1,39 @@
+from collections import OrderedDict
+
+
+class LruCache(object):
+    """Mapping holding at most maxsize entries, evicting the least recently
+    used entry first."""
+
+    def __init__(self, maxsize):
+        self.__maxsize = maxsize
+        self.__entries = OrderedDict()
+
+    @property
+    def maxsize(self):
+        return self.__maxsize
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def get(self, key, default=None):
+        try:
+            value = self.__entries.pop(key)
+        except KeyError:
+            return default
+        self.__entries[key] = value
+        return value
+
+    def put(self, key, value):
+        if self.__maxsize <= 0:
+            return
+        self.__entries.pop(key, None)
+        self.__entries[key] = value
+        while len(self.__entries) > self.__maxsize:
+            self.__entries.popitem(last=False)
+
+    def clear(self):
+        self.__entries.clear()
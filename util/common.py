@@ -1,3 +1,4 @@
+import mmap
 import struct
 
 
@@ -40,7 +41,37 @@ def align(size, stride):
 def read_null_terminated(stream):
     result = ""
     next = stream.read(1)
-    while stream and next != '\0':
+    while next and next != '\0':
         result += next
         next = stream.read(1)
     return result
+
+
+def map_stream(stream):
+    """Return the contents of a seekable stream as a read-only buffer.
+
+    Files are memory mapped, in-memory streams return their value and other
+    streams are read into a string. The position of the stream is left
+    unchanged.
+    """
+    try:
+        fileno = stream.fileno()
+    except (AttributeError, IOError, ValueError):
+        # e.g. io.BytesIO has fileno() but raises UnsupportedOperation
+        fileno = None
+
+    if fileno is None and hasattr(stream, "getvalue"):
+        return stream.getvalue()
+
+    offset = stream.tell()
+    if fileno is not None:
+        stream.seek(0, 2)
+        size = stream.tell()
+        stream.seek(offset)
+        if size > 0:
+            return mmap.mmap(fileno, 0, prot=mmap.PROT_READ)
+
+    stream.seek(0)
+    buf = stream.read()
+    stream.seek(offset)
+    return buf
@@ -1,8 +1,9 @@
+import mmap
 import struct
 from collections import namedtuple
 from contextlib import contextmanager
 
-from .common import align
+from .common import align, map_stream
 
 
 IFF_NATIVE_ENDIAN = 0
@@ -17,6 +18,18 @@ IffFormat = namedtuple("IffFormat", ["endianness",
 
 IffChunk = namedtuple("IffChunk", ["typeid", "data_offset", "data_length"])
 
+IffDamage = namedtuple("IffDamage", ["offset", "typeid", "message"])
+
+IffScanReport = namedtuple("IffScanReport", ["file_size",
+                                             "chunk_count",
+                                             "recoverable_bytes",
+                                             "recoverable_chunks",
+                                             "damage"])
+
+
+class IffError(ValueError):
+    pass
+
 
 def _get_header_struct(format):
     endian_formats = {IFF_NATIVE_ENDIAN: "=",
@@ -92,11 +105,24 @@ class IffParser(object):
         return self.__chunk_handlers.get(typeid, self.on_iff_chunk)
 
     def _iter_chunks(self, types=None):
+        # Same as _using_chunk for each chunk, which is too costly to
+        # enter as a context manager per chunk.
+        alignment = self.__format.chunk_alignment
         chunk = self._read_next_chunk()
         while chunk:
-            with self._using_chunk(chunk):
+            old_chunk = self.__current_chunk
+            old_chunk_end = self.__current_chunk_end
+            self.__current_chunk = chunk
+            self.__current_chunk_end = chunk.data_offset + align(chunk.data_length, alignment)
+            self._set_offset(chunk.data_offset)
+            try:
                 if types is None or chunk.typeid in types:
                     yield chunk
+            finally:
+                chunk_end = self.__current_chunk_end
+                self.__current_chunk = old_chunk
+                self.__current_chunk_end = old_chunk_end
+                self._set_offset(chunk_end)
             chunk = self._read_next_chunk()
 
     @contextmanager
@@ -116,9 +142,10 @@ class IffParser(object):
             self.__current_chunk_end = old_chunk_end
             self._set_offset(chunk_end)
 
-    def _realign(self):
+    def _realign(self, base_offset=None):
         chunk = self.__current_chunk
-        base_offset = self._get_offset()
+        if base_offset is None:
+            base_offset = self._get_offset()
         base_delta = chunk.data_offset + chunk.data_length - base_offset
         self.__current_chunk_end = base_offset + align(base_delta, self.__format.chunk_alignment)
 
@@ -140,6 +167,10 @@ class IffParser(object):
         
         typeid, data_length = header
         data_offset = self._get_offset()
+        if (self.__current_chunk_end is not None and
+                data_offset + data_length > self.__current_chunk_end):
+            raise IffError, "Iff: Chunk at offset %d exceeds parent bounds" % (
+                data_offset - self.__header_struct.size)
         return IffChunk(typeid=typeid,
                         data_offset=data_offset,
                         data_length=data_length)
@@ -162,3 +193,125 @@ class IffParser(object):
 
     def _set_offset(self, offset):
         self.__stream.seek(offset)
+
+
+class IffScanner(object):
+    """Validates the chunk structure of an IFF stream.
+
+    Only chunk headers (and the type of group chunks) are read. Every chunk
+    must fit inside the data of its parent, and its padding must fit inside
+    the aligned end of the parent. Type ids are not checked, since plugin
+    nodes and data use arbitrary numeric ids. The scan never reads past the
+    end of the stream, so damaged or truncated files are reported rather
+    than parsed.
+    """
+
+    def __init__(self, stream, format, group_typeids=()):
+        self.__stream = stream
+        self.__format = format
+        self.__header_struct = _get_header_struct(format)
+        self.__group_typeids = frozenset(group_typeids)
+
+    def scan(self, max_damage=None):
+        self.__stream.seek(0)
+        buf = map_stream(self.__stream)
+        try:
+            return self.__scan(buf, len(buf), max_damage)
+        finally:
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+
+    def __scan(self, buf, size, max_damage):
+        header_struct = self.__header_struct
+        header_size = header_struct.size
+        typeid_bytes = self.__format.typeid_bytes
+        alignment = self.__format.chunk_alignment
+        group_typeids = self.__group_typeids
+
+        damage = []
+        chunk_count = 0
+        recoverable_bytes = size
+        recoverable_chunks = None
+
+        # Each frame is [next_offset, aligned_end, data_end, truncated],
+        # where truncated is true if the parent was cut off by the end of
+        # the file (the file itself counts as such).
+        stack = [[0, size, size, True]]
+        while stack:
+            frame = stack[-1]
+            offset, end, data_end, truncated = frame
+            # Anything between the end of the data and the aligned end of
+            # the parent is padding.
+            if offset >= data_end:
+                stack.pop()
+                continue
+
+            typeid = None
+            error = None
+            fatal = True
+            cut_off = False
+            if data_end - offset < header_size:
+                error = "Truncated chunk header (%d bytes left)" % (
+                    data_end - offset)
+            else:
+                typeid, length = header_struct.unpack_from(buf, offset)
+                chunk_data = offset + header_size
+                chunk_data_end = chunk_data + length
+                is_group = typeid in group_typeids
+
+                if is_group and length < typeid_bytes:
+                    error = "Group chunk too small for its type id"
+                else:
+                    if chunk_data_end > data_end:
+                        error = "Chunk length %d exceeds parent bounds by %d bytes" % (
+                            length, chunk_data_end - data_end)
+                        if chunk_data_end > size:
+                            error += " (past end of file)"
+                        # A group cut off by the end of the file is still
+                        # walked, so that truncated files report their
+                        # intact contents. Groups reaching past the end
+                        # of an intact parent are damaged instead.
+                        cut_off = is_group and truncated and chunk_data_end > size
+                        fatal = not cut_off
+                        chunk_data_end = data_end
+
+                    if is_group:
+                        # Alignment is relative to the end of the group type
+                        base = chunk_data + typeid_bytes
+                        next_offset = base + align(chunk_data_end - base, alignment)
+                    else:
+                        next_offset = chunk_data + align(length, alignment)
+
+                    if next_offset > end:
+                        if not error:
+                            error = "Chunk padding exceeds parent bounds by %d bytes" % (
+                                next_offset - end)
+                        next_offset = end
+
+            if error:
+                damage.append(IffDamage(offset=offset, typeid=typeid, message=error))
+                stop = max_damage and len(damage) >= max_damage
+                if (fatal or stop) and recoverable_chunks is None:
+                    recoverable_bytes = offset
+                    recoverable_chunks = chunk_count
+                if stop:
+                    break
+                if fatal:
+                    # The remainder of the parent can't be trusted, resume
+                    # after the parent instead.
+                    stack.pop()
+                    continue
+
+            chunk_count += 1
+            frame[0] = next_offset
+            if is_group:
+                stack.append([base, next_offset, chunk_data_end, cut_off])
+
+        if recoverable_chunks is None:
+            recoverable_chunks = chunk_count
+
+        return IffScanReport(file_size=size,
+                             chunk_count=chunk_count,
+                             recoverable_bytes=recoverable_bytes,
+                             recoverable_chunks=recoverable_chunks,
+                             damage=damage)
@@ -0,0 +1,121 @@
+import os
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+from collections import namedtuple
+
+
+# Event masks, see inotify(7)
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_OPEN = 0x00000020
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+InotifyEvent = namedtuple("InotifyEvent", ["wd", "mask", "cookie", "name"])
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyError(OSError):
+    pass
+
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise InotifyError(errno.ENOSYS, "inotify is not available")
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def _check(result):
+    if result < 0:
+        error = ctypes.get_errno()
+        raise InotifyError(error, os.strerror(error))
+    return result
+
+
+class Inotify(object):
+    """Minimal inotify(7) binding.
+
+    Events are read without blocking longer than the given timeout, so
+    callers can interleave them with other periodic work.
+    """
+
+    def __init__(self):
+        self.__libc = _get_libc()
+        self.__fd = _check(self.__libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+
+    def fileno(self):
+        return self.__fd
+
+    def close(self):
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+
+    def add_watch(self, path, mask):
+        return _check(self.__libc.inotify_add_watch(self.__fd, path, mask))
+
+    def remove_watch(self, wd):
+        _check(self.__libc.inotify_rm_watch(self.__fd, wd))
+
+    def read_events(self, timeout=None):
+        """Return the pending events, waiting up to timeout seconds for
+        the first one."""
+        readable, _, _ = select.select([self.__fd], [], [], timeout)
+        if not readable:
+            return []
+
+        events = []
+        while True:
+            try:
+                buf = os.read(self.__fd, 64 * 1024)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buf):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip("\0")
+                offset += length
+                events.append(InotifyEvent(wd=wd, mask=mask, cookie=cookie, name=name))
+        return events
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,264 @@
+import os
+import time
+import ctypes
+import ctypes.util
+import threading
+from cStringIO import StringIO
+from collections import namedtuple
+
+
+PrefetchedFile = namedtuple("PrefetchedFile", ["path", "stream", "error"])
+
+POSIX_FADV_WILLNEED = 3
+
+_libc = None
+
+
+def fadvise_willneed(fileno):
+    """Ask the kernel to start reading a whole file into the page cache."""
+    global _libc
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fileno, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        return
+
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    fadvise = getattr(_libc, "posix_fadvise", None)
+    if fadvise is not None:
+        fadvise.argtypes = [ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_int]
+        fadvise(fileno, 0, 0, POSIX_FADV_WILLNEED)
+
+
+def _open_binary(path):
+    return open(path, "rb")
+
+
+class ThrottledFile(object):
+    """File wrapper adding a fixed latency and optional bandwidth limit to
+    every read, to simulate slow network file systems."""
+
+    def __init__(self, stream, latency=0.0, bandwidth=None):
+        self.__stream = stream
+        self.__latency = latency
+        self.__bandwidth = bandwidth
+
+    @property
+    def name(self):
+        return self.__stream.name
+
+    def read(self, size=-1):
+        data = self.__stream.read(size)
+        delay = self.__latency
+        if self.__bandwidth:
+            delay += float(len(data)) / self.__bandwidth
+        if delay > 0:
+            time.sleep(delay)
+        return data
+
+    def readline(self, size=-1):
+        return self.__stream.readline(size)
+
+    def seek(self, offset, whence=0):
+        self.__stream.seek(offset, whence)
+
+    def tell(self):
+        return self.__stream.tell()
+
+    def close(self):
+        self.__stream.close()
+
+    def __iter__(self):
+        return iter(self.__stream)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _MemoryFile(object):
+    """Read-only in-memory file whose getvalue() returns the data it was
+    created from, rather than a copy like cStringIO's."""
+
+    def __init__(self, data):
+        stream = StringIO(data)
+        self.__data = data
+        self.__stream = stream
+        # Bound directly, parsers call these for every chunk
+        self.read = stream.read
+        self.readline = stream.readline
+        self.seek = stream.seek
+        self.tell = stream.tell
+
+    def getvalue(self):
+        return self.__data
+
+    def close(self):
+        self.__stream.close()
+        self.__data = None
+
+    def __iter__(self):
+        return iter(self.__stream)
+
+
+# Seconds between checks for interrupts while waiting for a file. Python 2
+# can't interrupt a wait on a condition without a timeout.
+_WAIT_INTERVAL = 0.1
+
+
+class ReadAheadScheduler(object):
+    """Reads files on a pool of threads ahead of their consumer.
+
+    Iterating yields a PrefetchedFile for every path, in order. Up to window
+    files ahead of the consumer are opened and read into memory in blocks of
+    block_size bytes, as long as the files in flight fit into memory_budget.
+    Files larger than large_file_size are not buffered; their kernel
+    read-ahead is started instead and the open file is yielded.
+
+    A buffered stream is released once the consumer advances to the next
+    file. Its getvalue() returns the buffered data without copying it.
+    Errors opening or reading a file are yielded with a None stream.
+    """
+
+    def __init__(self, paths, workers=4, window=16,
+                 memory_budget=256 << 20, block_size=4 << 20,
+                 large_file_size=None, open_file=None):
+        self.__paths = list(paths)
+        self.__workers = max(1, workers)
+        self.__window = max(1, window)
+        self.__memory_budget = memory_budget
+        self.__block_size = block_size
+        self.__large_file_size = (large_file_size if large_file_size is not None
+                                  else memory_budget)
+        self.__open_file = open_file or _open_binary
+
+        self.__condition = threading.Condition()
+        self.__results = {}
+        self.__next_index = 0
+        self.__current_index = 0
+        self.__in_flight = 0
+        self.__closed = False
+
+    def __len__(self):
+        return len(self.__paths)
+
+    def __iter__(self):
+        for i in range(min(self.__workers, len(self.__paths))):
+            thread = threading.Thread(target=self.__work)
+            thread.daemon = True
+            thread.start()
+
+        condition = self.__condition
+        try:
+            for index in range(len(self.__paths)):
+                with condition:
+                    self.__current_index = index
+                    condition.notify_all()
+                    while index not in self.__results:
+                        condition.wait(_WAIT_INTERVAL)
+                    result, reserved = self.__results.pop(index)
+                try:
+                    yield result
+                finally:
+                    if result.stream is not None:
+                        result.stream.close()
+                    self.__release(reserved)
+        finally:
+            # Workers aren't joined, as they may be blocked on a slow file
+            # system. Those still loading discard their result.
+            with condition:
+                self.__closed = True
+                condition.notify_all()
+                results = self.__results.values()
+                self.__results.clear()
+            for result, reserved in results:
+                if result.stream is not None:
+                    result.stream.close()
+
+    def __work(self):
+        condition = self.__condition
+        while True:
+            with condition:
+                while (not self.__closed and
+                       self.__next_index < len(self.__paths) and
+                       self.__next_index >= self.__current_index + self.__window):
+                    condition.wait()
+                if self.__closed or self.__next_index >= len(self.__paths):
+                    return
+                index = self.__next_index
+                self.__next_index += 1
+
+            path = self.__paths[index]
+            reserved = 0
+            try:
+                result, reserved = self.__load(index, path)
+            except Exception as e:
+                # Any error must be posted, or the consumer waits forever
+                result = PrefetchedFile(path=path, stream=None, error=e)
+
+            with condition:
+                if not self.__closed:
+                    self.__results[index] = (result, reserved)
+                    condition.notify_all()
+                    continue
+            if result.stream is not None:
+                result.stream.close()
+            return
+
+    def __load(self, index, path):
+        stream = self.__open_file(path)
+        try:
+            stream.seek(0, 2)
+            size = stream.tell()
+            stream.seek(0)
+
+            if size > self.__large_file_size:
+                if hasattr(stream, "fileno"):
+                    fadvise_willneed(stream.fileno())
+                # The open file is handed over to the consumer
+                result = PrefetchedFile(path=path, stream=stream, error=None)
+                stream = None
+                return result, 0
+
+            if not self.__reserve(index, size):
+                return PrefetchedFile(path=path, stream=None, error=None), 0
+
+            try:
+                blocks = []
+                block = stream.read(self.__block_size)
+                while block:
+                    blocks.append(block)
+                    block = stream.read(self.__block_size)
+            except:
+                self.__release(size)
+                raise
+
+            data = _MemoryFile("".join(blocks))
+            return PrefetchedFile(path=path, stream=data, error=None), size
+        finally:
+            if stream is not None:
+                stream.close()
+
+    def __reserve(self, index, size):
+        # The file the consumer is waiting for is always admitted, so that
+        # files ahead of it can't starve it of memory.
+        condition = self.__condition
+        with condition:
+            while (not self.__closed and
+                   self.__in_flight > 0 and
+                   self.__in_flight + size > self.__memory_budget and
+                   index != self.__current_index):
+                condition.wait()
+            if self.__closed:
+                return False
+            self.__in_flight += size
+            return True
+
+    def __release(self, size):
+        with self.__condition:
+            self.__in_flight -= size
+            self.__condition.notify_all()